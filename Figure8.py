@@ -2,127 +2,135 @@ import numpy as np
 import pandas as pd
 import matplotlib as mpl
 import matplotlib.pyplot as plt
-import glob, os
+import os, argparse, functools, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import noise_models
+import selection
+import jsondb
+import periods
+import instrument
+import export
 
-def plotBrune(ax):
-	'''Plot Brune corner frequencies for mag/dist ranges of interest
-	   (see esupp for details on calculation)'''
-	# Read file containing list of corner frequencies
-	dirname = os.path.dirname(__file__)
-	brunecsv = os.path.join(dirname,'../DBs/brune-all.csv')
-	df = pd.read_csv(brunecsv, names=['delta', 'mag', 'T', 'dB'], 
+@functools.lru_cache(maxsize=None)
+def bruneGrid(brunecsv='DBs/brune-all.csv'):
+	'''Brune corner-frequency grid lines and labels for M <= 4,
+	   grouped once per distance and magnitude'''
+	df = pd.read_csv(brunecsv, names=['delta', 'mag', 'T', 'dB'],
 					 skiprows=1, sep=',')
 	df = df[df['mag'] <= 4]
+	# Lines connecting all magnitudes at a given distance,
+	# then all distances at a given magnitude
+	delta_lines = [(delta, sub['T'].to_numpy(), sub['dB'].to_numpy()) for delta, sub in df.groupby('delta', sort=False)]
+	mag_lines = [(sub['T'].to_numpy(), sub['dB'].to_numpy()) for _, sub in df.groupby('mag', sort=False)]
+	# Labels for magnitudes and distances
+	labels = []
+	df_text = df[df['delta'] == 0.01]
+	for mag in np.arange(1,5):
+		for T, dB in df_text.loc[df_text['mag'] == mag, ['T', 'dB']].to_numpy():
+			labels.append((T, dB+4, "M{0}".format(mag), dict(ha='center')))
+	df_text = df[df['mag'] == 4]
+	for delta, _, _ in delta_lines:
+		for T, dB in df_text.loc[df_text['delta'] == delta, ['T', 'dB']].to_numpy():
+			labels.append((T+0.02, dB+2.5, "{0:0d} km".format(int(delta*100)), dict(rotation=30)))
+	return delta_lines, mag_lines, labels
 
-	# Plot grid of corner frequencies:
-	# Draw lines connecting all magnitudes at a given distance,
-	# then all distances at a given magnitude 
+def plotBrune(ax):
+	'''Plot Brune corner frequencies for mag/dist ranges of interest
+	   (see esupp for details on calculation)'''
+	delta_lines, mag_lines, labels = bruneGrid()
 	gridcolor='#1f77b4' # darker blue
 	linestyle={'color' : gridcolor,
 			   'mfc' : gridcolor,
 			   'linewidth' : 1,
 			   'linestyle' : '--'}
-	deltas = pd.unique(df['delta'])
-	for delta in deltas:
-		df_subset = df[df['delta'] == delta]
-		if delta == 1:
-			label=r'Brune f$_c$'
-		else:
-			label=''
-		ax.plot(df_subset['T'], df_subset['dB'], marker='.', 
-				**linestyle, label=label)
-	mags = pd.unique(df['mag'])
-	for mag in mags:
-		df_subset = df[df['mag'] == mag]
-		ax.plot(df_subset['T'], df_subset['dB'], marker='None', 
-				**linestyle, label='')
+	for delta, T, dB in delta_lines:
+		label = r'Brune f$_c$' if delta == 1 else ''
+		ax.plot(T, dB, marker='.', **linestyle, label=label)
+	for T, dB in mag_lines:
+		ax.plot(T, dB, marker='None', **linestyle, label='')
+	for x, y, text, kw in labels:
+		ax.text(x, y, text, va='center', color=gridcolor, **kw)
 
-	# Plot labels on grid for magnitudes and distances
-	df_text = df[df['delta'] == 0.01]
-	mags = np.arange(1,5)
-	for mag in mags:
-		df_plot = df_text[df_text['mag'] == mag]
-		ax.text(df_plot['T'], df_plot['dB']+4, 
-				"M{0}".format(mag), va='center', ha='center', 
-				color=gridcolor)
-	df_text = df[df['mag'] == 4]
-	for delta in deltas:
-		df_plot = df_text[df_text['delta'] == delta]
-		ax.text(df_plot['T']+0.02, df_plot['dB']+2.5, 
-				"{0:0d} km".format(int(delta*100)), va='center', 
-				rotation=30, color=gridcolor)
+def modelAxes():
+	'''Figure with the Italian model curves and the Brune grid, drawn once per process'''
+	mpl.rcParams.update({'font.size': 16})
+	fig, ax = plt.subplots(figsize=(10,6))
+	# Plot Model
+	ax.plot(df.Period,df.Median, '--r', label='Median')
+	ax.plot(df.Period,df.IALNM,'.--r')
+	ax.plot(df.Period,df.IAHNM,'.--r',label='IAHNM - IALNM')
+	ax.set_ylabel('Power (dB)')
+	ax.set_xlabel('Period (s)')
+	ax.semilogx()
+	ax.set_xlim(0.01, 100)
+	ax.set_ylim(-200, -50)
+	# Plot Brune corner frequency grid
+	plotBrune(ax)
+	return fig, ax
 
-def ALNM_P(P):
-	Pl = [0.01, 1., 10., 150.,]
-	lnm = [-135., -135., -130., -118.25,]
-	if Pl[0]<=P<=Pl[-1]:
-		lnm_P = np.interp(P, Pl, lnm)
-		return lnm_P
-	else:
-		print(f'P={P} out of ALNM range.')
-		return np.nan
-def AHNM_P(P):
-	Ph = [0.01, 0.1, 0.22, 0.32, 0.80, 3.8, 4.6, 6.3, 7.1, 150.,]
-	hnm = [-91.5, -91.5, -97.41, -110.5, -120., -98., -96.5, -101., -105., -91.25]
-	if Ph[0]<=P<=Ph[-1]:    
-		hnm_P = np.interp(P, Ph, hnm)
-		return hnm_P
-	else:
-		print(f'P={P} out of ALNM range.')
-		return np.nan
+_axes = None
+def plotStation(job):
+	'''Draw one station on the shared model axes and save it'''
+	global _axes
+	sta, vals, vals_covid, basename = job
+	if _axes is None:
+		_axes = modelAxes()
+	fig, ax = _axes
+	try:
+		lines = ax.plot(periods2022,vals,'k',label=f'{sta} 2022')
+		lines += ax.plot(periodscovid,vals_covid,'y',label=f'{sta} Lockdown')
+		legend = ax.legend(loc='lower right')
+		export.save(fig, basename)
+		for line in lines:
+			line.remove()
+		legend.remove()
+		return sta, True
+	except Exception:
+		return sta, False
+
+parser = argparse.ArgumentParser(description='Station PSDs against the Italian noise model.')
+parser.add_argument('stations', nargs='*', help='stations to plot (default: PTF)')
+parser.add_argument('--all', action='store_true', help='every station of ninetyplus.csv')
+parser.add_argument('-j', '--jobs', type=int, default=1, help='processes for batch mode')
+args = parser.parse_args()
+instrument.start('Fig8')
 
 # Fornasari et al. 2022 model
-df = pd.read_csv('../DBs/italian_model.csv')
+it_model = noise_models.ItalianModel('DBs/italian_model.csv')
+df = it_model.db
 # 90+
-ninety = pd.read_csv('../DBs/ninetyplus.csv')
-long_stas = ninety.Station.tolist()
+long_stas = sorted(selection.ninetyplus())
 
 # Year 2022
-import json
-f = open('../DBs/jsons/yearly_median_all.json')
-# returns JSON object as a dictionary
-db_2022 = json.load(f)
+db_2022 = jsondb.load('DBs/jsons/yearly_median_all.json')
 # Lockdown
-f = open('../DBs/jsons/yearly_median_all_covid.json')
-# returns JSON object as a dictionary
-db_covid = json.load(f)
+db_covid = jsondb.load('DBs/jsons/yearly_median_all_covid.json')
 
-stas = ['PTF']
-for sta in stas:
-	try:
-		periods2022 = []
-		vals = []
-		for period in db_2022.keys():
-			val = db_2022[period][sta]
-			vals.append(val)
-			periods2022.append(float(period))
-		vals_covid = []
-		periodscovid = []
-		for period in db_covid.keys():
-			val = db_covid[period][sta]
-			vals_covid.append(val)
-			periodscovid.append(float(period))
+stas = long_stas if args.all else (args.stations or ['PTF'])
+# Single station keeps the Figures/Fig8 name, batches go to Figures/Fig8/<sta>
+if len(stas) == 1 and not args.all:
+	basenames = ['Figures/Fig8']
+else:
+	os.makedirs('Figures/Fig8', exist_ok=True)
+	basenames = [f'Figures/Fig8/{sta}' for sta in stas]
 
-		mpl.rcParams.update({'font.size': 16})
-		fig, ax = plt.subplots(figsize=(10,6))
-		# Plot Model
-		ax.plot(df.Period,df.Median, '--r', label='Median')
-		ax.plot(df.Period,df.IALNM,'.--r')
-		ax.plot(df.Period,df.IAHNM,'.--r',label='IAHNM - IALNM')
-		ax.plot(periods2022,vals,'k',label=f'{sta} 2022')
-		ax.plot(periodscovid,vals_covid,'y',label=f'{sta} Lockdown')
-		ax.set_ylabel('Power (dB)')
-		ax.set_xlabel('Period (s)')
-		ax.semilogx()
-		ax.set_xlim(0.01, 100)
-		ax.set_ylim(-200, -50)
-		# Plot Brune corner frequency grid
-		plotBrune(ax)
+# All station curves at once, (station, period) on sorted float periods
+periods2022, vals = periods.table(db_2022, stas)
+periodscovid, vals_covid = periods.table(db_covid, stas)
+bruneGrid()
 
-		ax.legend(loc='lower right')
-		plt.savefig(f'Figure8.png', dpi=300, bbox_inches='tight')
-		plt.savefig(f'Figure8.svg', dpi=300, bbox_inches='tight')
-		plt.close(fig)
-	except:
+# Stations without a curve in either database are not plotted
+found = ~np.isnan(vals).all(axis=1) & ~np.isnan(vals_covid).all(axis=1)
+jobs = [(sta, v, vc, base) for sta, v, vc, base, ok in zip(stas, vals, vals_covid, basenames, found) if ok]
+with instrument.stage('plot', stations=len(jobs)):
+	if args.jobs > 1:
+		with ProcessPoolExecutor(args.jobs, mp_context=multiprocessing.get_context('fork')) as pool:
+			done = list(pool.map(plotStation, jobs, chunksize=max(1, len(jobs) // (4 * args.jobs))))
+	else:
+		done = [plotStation(job) for job in jobs]
+done += [(sta, False) for sta, ok in zip(stas, found) if not ok]
+for sta, ok in done:
+	if not ok:
 		print(f'Problem in station: {sta}')
-		continue
+plt.close('all')
+instrument.report()
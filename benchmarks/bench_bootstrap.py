@@ -0,0 +1,50 @@
+'''Benchmark bootstrap.median_diff_ci against a plain resample-and-median loop.
+
+	python -m benchmarks.bench_bootstrap
+'''
+import time
+
+import numpy as np
+
+import bootstrap
+
+
+def loop_ci(a, b, resamples, level=95, seed=0):
+	# Draw every resample and take its median, one station at a time
+	rng = np.random.default_rng(seed)
+	tail = (100 - level) / 2
+	out = []
+	for i in range(len(a[1]) - 1):
+		xa, xb = a[0][a[1][i]:a[1][i + 1]], b[0][b[1][i]:b[1][i + 1]]
+		boot = (np.median(xa[rng.integers(0, len(xa), (resamples, len(xa)))], axis=1)
+				- np.median(xb[rng.integers(0, len(xb), (resamples, len(xb)))], axis=1))
+		out.append(np.percentile(boot, [tail, 100 - tail]))
+	return np.array(out).T
+
+
+def synthetic_samples(stations, low, high, shift=0., seed=0):
+	rng = np.random.default_rng(seed)
+	counts = rng.integers(low, high + 1, stations)
+	return rng.normal(-140 + shift, 5, counts.sum()), np.concatenate([[0], np.cumsum(counts)])
+
+
+if __name__ == '__main__':
+	stations, periods, resamples = 1000, 4, 10000
+	a = synthetic_samples(stations, 200, 365, shift=1, seed=1)
+	b = synthetic_samples(stations, 40, 70, seed=2)
+
+	start = time.perf_counter()
+	for period in range(periods):
+		diff, low, high, pvalue = bootstrap.median_diff_ci(a, b, resamples, seed=period)
+	fast = time.perf_counter() - start
+
+	# The loop is timed on a few stations and scaled up
+	few = 10
+	start = time.perf_counter()
+	loop_low, loop_high = loop_ci((a[0], a[1][:few + 1]), (b[0], b[1][:few + 1]), resamples)
+	slow = (time.perf_counter() - start) * stations / few * periods
+	print(f'{stations} stations x {periods} periods x {resamples} resamples')
+	print(f'loop (extrapolated): {slow:.0f} s')
+	print(f'bootstrap          : {fast:.1f} s ({slow / fast:.0f}x)')
+	print(f'max interval difference on {few} stations: '
+		  f'{max(np.abs(loop_low - low[:few]).max(), np.abs(loop_high - high[:few]).max()):.3f} dB')
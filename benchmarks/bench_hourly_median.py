@@ -0,0 +1,41 @@
+'''Benchmark psd_stats.hourly_medians against the nested nanmedian loop of Figure7.py.
+
+	python -m benchmarks.bench_hourly_median
+'''
+import timeit
+
+import numpy as np
+
+import psd_stats
+
+
+def loop_medians(vals):
+	# The per-hour, per-period loop Figure7.py used
+	meds = np.empty(vals.shape[1:])
+	for hour in range(vals.shape[1]):
+		for freq in range(vals.shape[2]):
+			meds[hour, freq] = np.nanmedian(vals[:, hour, freq])
+	return meds
+
+
+def synthetic_cube(days=365, hours=24, nper=20, nan_frac=0.1, seed=0):
+	rng = np.random.default_rng(seed)
+	vals = rng.normal(-140, 10, (days, hours, nper))
+	vals[rng.random(vals.shape) < nan_frac] = np.nan
+	return vals
+
+
+if __name__ == '__main__':
+	vals = synthetic_cube()
+	assert np.allclose(loop_medians(vals), psd_stats.hourly_medians(vals), equal_nan=True)
+	assert np.allclose(np.nanpercentile(vals, [5, 95], axis=0),
+					   psd_stats.hourly_percentiles(vals, [5, 95]), equal_nan=True)
+
+	number = 5
+	t_loop = timeit.timeit(lambda: loop_medians(vals), number=number) / number
+	t_vec = timeit.timeit(lambda: psd_stats.hourly_medians(vals), number=number) / number
+	t_np = timeit.timeit(lambda: np.nanmedian(vals, axis=0), number=number) / number
+	print(f'cube {vals.shape}')
+	print(f'nested loop       {t_loop * 1e3:8.2f} ms')
+	print(f'np.nanmedian axis {t_np * 1e3:8.2f} ms')
+	print(f'hourly_medians    {t_vec * 1e3:8.2f} ms  ({t_loop / t_vec:.0f}x)')
@@ -0,0 +1,90 @@
+'''Time the data path of every figure on synthetic DBs of growing size.
+
+For each network size a synthetic DBs/ tree is written (synthetic.py) and
+every figure script runs on it in its own process with offline tiles. The
+instrument report of the run splits the wall time into the data path
+(JSON loading, station lookups, npz reading, statistics) and the stages
+that only draw or save.
+
+	python -m benchmarks.bench_scaling                      # 100, 1000, 10000 stations
+	python -m benchmarks.bench_scaling --sizes 100 1000 --keep /tmp/bench
+'''
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import make_figures
+import synthetic
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Top-level stages that draw or save rather than handle data
+RENDER = ('tiles', 'render', 'save', 'workers', 'plot')
+
+
+def run_figure(fig, root):
+	'''Run one figure script in root; returns its instrument report (None if it wrote none).'''
+	env = dict(os.environ, PYTHONPATH=REPO, MPLBACKEND='Agg', TILES_OFFLINE='1')
+	script = os.path.join(REPO, make_figures.FIGURES[fig]['script'])
+	proc = subprocess.run([sys.executable, script], cwd=root, env=env, capture_output=True, text=True)
+	path = os.path.join(root, 'Figures', 'reports', fig + '.jsonl')
+	if not os.path.exists(path):
+		return None, proc.stderr.strip().splitlines()[-1:] or ['no report']
+	with open(path) as f:
+		run = json.loads(f.readlines()[-1])
+	error = proc.stderr.strip().splitlines()[-1:] if proc.returncode else []
+	return run, error
+
+
+def split(run):
+	'''(data path, render) seconds of a report.'''
+	render = sum(rec['wall'] for path, rec in run['stages'].items() if path in RENDER)
+	return run['wall'] - render, render
+
+
+def slowest(run):
+	data = {path: rec['wall'] for path, rec in run['stages'].items() if path.split('/')[0] not in RENDER}
+	if not data:
+		return ''
+	path = max(data, key=data.get)
+	return f'{path} {data[path]:.2f} s'
+
+
+def bench(sizes, figs, days, periods, samples, keep=None):
+	base = keep or tempfile.mkdtemp(prefix='bench_scaling_')
+	print(f'{"stations":>8} {"figure":>6} {"data s":>8} {"render s":>9} {"peak MB":>8}  slowest data stage')
+	try:
+		for n in sizes:
+			root = os.path.join(base, str(n))
+			if not os.path.exists(os.path.join(root, 'DBs')):
+				start = time.perf_counter()
+				synthetic.generate(root, stations=n, days=days, nper=periods, samples=samples)
+				print(f'{n:>8} {"DBs":>6} {time.perf_counter() - start:8.2f} (generated)')
+			os.makedirs(os.path.join(root, 'Figures'), exist_ok=True)
+			for fig in figs:
+				run, error = run_figure(fig, root)
+				if run is None:
+					print(f'{n:>8} {fig:>6} failed: {error[0]}')
+					continue
+				data, render = split(run)
+				note = f'  ({"incomplete: " + error[0] if error else "incomplete"})' if not run['complete'] else ''
+				print(f'{n:>8} {fig:>6} {data:8.2f} {render:9.2f} {run["peak_rss_mb"]:8.0f}  {slowest(run)}{note}')
+	finally:
+		if keep is None:
+			shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Figure data-path timings at growing network sizes.')
+	parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+	parser.add_argument('--figures', nargs='+', default=list(make_figures.FIGURES))
+	parser.add_argument('--days', type=int, default=2, help='sens_only days per year')
+	parser.add_argument('--periods', type=int, default=20)
+	parser.add_argument('--samples', type=int, default=10, help='most samples per station in the day/night JSONs')
+	parser.add_argument('--keep', help='directory to keep (and reuse) the synthetic trees in')
+	args = parser.parse_args()
+	bench(args.sizes, args.figures, args.days, args.periods, args.samples, args.keep)
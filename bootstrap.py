@@ -0,0 +1,129 @@
+'''Bootstrap confidence intervals for the 2022 - lockdown median differences.
+
+For every station the samples of a period (one per day in the day/night
+and weekday/weekend databases) are resampled with replacement and the
+difference of the two resampled medians gives the interval. The median of
+a resample of sorted values is the value at a random rank, and the
+distribution of that rank only depends on the sample size n,
+
+	P(k-th order statistic <= x_j) = P(Binomial(n, j/n) >= k)
+
+so a resample costs one uniform draw and a searchsorted instead of n draws
+and a partial sort. Stations are grouped by sample size and every group is
+drawn as one (station, resample) matrix. Odd sizes are exact; for even
+sizes the two middle order statistics are drawn from the same uniform,
+which keeps their exact marginals.
+
+	ci = station_ci('DBs/jsons/day_ext.json', 'DBs/jsons/day_ext_covid.json', stas, periods)
+	keep = ci.significant[per_idx]
+
+Several databases per side (e.g. day and night for yearly samples) are
+pooled per station.
+'''
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.special import betainc
+
+import instrument
+import jsondb
+
+RESAMPLES = 10000
+LEVEL = 95
+# Largest (station, resample) matrix drawn at once
+BLOCK = 1 << 22
+
+CI = namedtuple('CI', ['periods', 'stations', 'diff', 'low', 'high', 'pvalue', 'significant'])
+
+
+def samples(paths, period, stas):
+	'''(values, offsets) of the finite samples of every station, pooled over paths.
+
+	Stations missing from a database contribute no samples.'''
+	paths = [paths] if isinstance(paths, str) else paths
+	segs = [[] for _ in stas]
+	for path in paths:
+		view = jsondb.load(path)[period]
+		for seg, sta in zip(segs, stas):
+			if sta in view:
+				seg.append(np.atleast_1d(view[sta]))
+	segs = [np.concatenate(seg) if seg else np.empty(0) for seg in segs]
+	segs = [seg[np.isfinite(seg)] for seg in segs]
+	offsets = np.cumsum([0] + [len(seg) for seg in segs])
+	return (np.concatenate(segs) if len(offsets) > 1 else np.empty(0)), offsets
+
+
+def rank_cdf(n, k):
+	'''CDF over ranks 0..n-1 of the k-th (1-based) smallest of n draws from n sorted values.'''
+	return betainc(k, n - k + 1, np.arange(1, n + 1) / n)
+
+
+def _group_medians(vals, n, u):
+	# vals: (station, n) sorted rows, u: (station, resample) uniforms
+	lo = np.minimum(np.searchsorted(rank_cdf(n, (n + 1) // 2), u), n - 1)
+	hi = np.minimum(np.searchsorted(rank_cdf(n, n // 2 + 1), u), n - 1)
+	return (np.take_along_axis(vals, lo, axis=1) + np.take_along_axis(vals, hi, axis=1)) / 2
+
+
+def resampled_medians(values, offsets, resamples=RESAMPLES, rng=None):
+	'''(station, resample) bootstrap medians of ragged samples, NaN rows for empty stations.'''
+	rng = np.random.default_rng(rng)
+	counts = np.diff(offsets)
+	seg = np.repeat(np.arange(len(counts)), counts)
+	srt = values[np.lexsort((values, seg))]
+	out = np.full((len(counts), resamples), np.nan)
+	for n in np.unique(counts[counts > 0]):
+		idx = np.flatnonzero(counts == n)
+		rows = srt[offsets[idx][:, None] + np.arange(n)]
+		step = max(1, BLOCK // resamples)
+		for i in range(0, len(idx), step):
+			u = rng.random((len(idx[i:i + step]), resamples))
+			out[idx[i:i + step]] = _group_medians(rows[i:i + step], n, u)
+	return out
+
+
+def median_diff_ci(a, b, resamples=RESAMPLES, level=LEVEL, seed=0):
+	'''Interval of median(a) - median(b) per station from (values, offsets) pairs.
+
+	Returns (diff, low, high, pvalue) arrays; pvalue is the two-sided
+	bootstrap probability of a difference of the other sign.'''
+	ss = np.random.SeedSequence(seed)
+	rng_a, rng_b = (np.random.default_rng(s) for s in ss.spawn(2))
+	med_a = resampled_medians(*a, resamples, rng_a)
+	med_b = resampled_medians(*b, resamples, rng_b)
+	boot = med_a - med_b
+	diff = np.array([np.median(a[0][a[1][i]:a[1][i + 1]]) - np.median(b[0][b[1][i]:b[1][i + 1]])
+					 if a[1][i + 1] > a[1][i] and b[1][i + 1] > b[1][i] else np.nan
+					 for i in range(len(a[1]) - 1)])
+	tail = (100 - level) / 2
+	low, high = np.percentile(boot, [tail, 100 - tail], axis=1)
+	pvalue = np.minimum(1., 2 * np.minimum((boot <= 0).mean(axis=1), (boot >= 0).mean(axis=1)))
+	pvalue[np.isnan(diff)] = np.nan
+	return diff, low, high, pvalue
+
+
+def _period_job(job):
+	paths_a, paths_b, period, stas, resamples, level, seed = job
+	return median_diff_ci(samples(paths_a, period, stas), samples(paths_b, period, stas),
+						  resamples, level, seed)
+
+
+@instrument.timed('bootstrap')
+def station_ci(paths_a, paths_b, stas, periods, resamples=RESAMPLES, level=LEVEL, seed=0, processes=1):
+	'''Bootstrap intervals of median(a) - median(b) for every (period, station).
+
+	paths_a and paths_b are a JSON database or a list of them pooled per
+	station. Periods run in a fork pool when processes > 1. All arrays are
+	(period, station); significant is False where the interval contains 0
+	or a station has no samples on either side.'''
+	jobs = [(paths_a, paths_b, period, list(stas), resamples, level, seed + i) for i, period in enumerate(periods)]
+	if processes > 1:
+		with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('fork')) as pool:
+			res = list(pool.map(_period_job, jobs))
+	else:
+		res = [_period_job(job) for job in jobs]
+	diff, low, high, pvalue = (np.array(arr).reshape(len(periods), len(stas)) for arr in zip(*res))
+	significant = (low > 0) | (high < 0)
+	return CI(list(periods), list(stas), diff, low, high, pvalue, significant)
@@ -0,0 +1,183 @@
+'''Hour-of-day median noise profiles of every station from the PSD store.
+
+The hour of day of every hour key is read from its name: the hour of a
+time stamp ('2022-03-10T13:30:00'), or the number at the end of the key
+('h13', '13', '13:30'). Keys of the same hour (finer windows) are pooled,
+and keys that give no hour from 0 to 23 raise ValueError. For every
+station and year the
+profile is the median over days (and the keys of the hour) of each
+period, or of the mean dB level inside each period band:
+
+	values[year, station, hour, period or band]
+
+Stations are read from the store BATCH at a time into one NaN-padded
+(station, day, key, period) block and reduced together with
+psd_stats.hourly_percentiles, batches spread over forked processes.
+Days in exclusions.csv are left out. The profiles of a run are written to
+DBs/diurnal.npz and queried by station or by province:
+
+	python diurnal.py --years 2020 2022 --bands 0.1-1 1-10 -j 4
+
+	prof = diurnal.load()
+	diurnal.station(prof, 'PTF', '2022')         # (24, bands)
+	diurnal.province(prof, 'Milano', '2020')     # median of its stations
+'''
+import argparse
+import multiprocessing
+import re
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import exclusions
+import instrument
+import jsondb
+import periods as period_axis
+import provinces
+import psd_stats
+import psd_store
+
+OUT = 'DBs/diurnal.npz'
+HOURS = 24
+BATCH = 32
+
+Profiles = namedtuple('Profiles', ['years', 'stations', 'periods', 'bands', 'values'])
+
+
+# Hour of an ISO time stamp, else the number ending the key (hh, hh:mm, hh:mm:ss)
+_STAMP = re.compile(r'T(\d{2})')
+_TRAILING = re.compile(r'(?<!\d)(\d{1,2})(?::\d{2}){0,2}$')
+
+
+def key_hours(keys):
+	'''Hour of day of every hour key, parsed from the key names.'''
+	hours = []
+	for key in keys:
+		match = _STAMP.search(key) or _TRAILING.search(key)
+		if match is None or int(match.group(1)) >= HOURS:
+			raise ValueError(f'no hour of day in the hour key {key!r}')
+		hours.append(int(match.group(1)))
+	return np.array(hours, dtype=int)
+
+
+def _block(cubes, nkeys, nper, days=None):
+	# NaN-padded (station, day, key, period) block of the station cubes
+	keep = [cube.vals if days is None else cube.vals[(cube.days >= days[0]) & (cube.days <= days[1])]
+			for cube in cubes]
+	out = np.full((len(cubes), max([len(v) for v in keep] + [1]), nkeys, nper), np.nan, dtype=np.float32)
+	for i, vals in enumerate(keep):
+		out[i, :len(vals)] = vals
+	return out
+
+
+def batch_profiles(block, keys, bands=None, periods=None, q=50):
+	'''(station, hour, period or band) percentiles of a (station, day, key, period) block.'''
+	nsta = block.shape[0]
+	hours = key_hours(keys)
+	if bands is not None:
+		# Mean dB level of every band per sample
+		block = period_axis.band_average(periods, block, bands)
+	out = np.full((nsta, HOURS, block.shape[-1]), np.nan)
+	for hour in range(HOURS):
+		cols = np.flatnonzero(hours == hour)
+		if not len(cols):
+			continue
+		# Days and the keys of the hour pooled on the leading axis
+		samples = np.moveaxis(block[:, :, cols], 0, 2).reshape(-1, nsta, block.shape[-1])
+		out[:, hour] = psd_stats.hourly_percentiles(samples, q)
+	return out
+
+
+def _batch_job(args):
+	stas, year, nper, bands, days, q, store, exclude = args
+	cubes = [psd_store.load(sta, year, nper, store, exclude) for sta in stas]
+	found = [i for i, cube in enumerate(cubes) if cube is not None]
+	out = np.full((len(stas), HOURS, len(bands) if bands is not None else nper), np.nan)
+	if found:
+		cubes = [cubes[i] for i in found]
+		block = _block(cubes, len(cubes[0].keys), nper, days)
+		out[found] = batch_profiles(block, cubes[0].keys, bands, cubes[0].periods, q)
+	return out, exclusions.lost
+
+
+@instrument.timed('diurnal')
+def build(years=('2020', '2022'), stas=None, bands=None, nper=None, days=None, q=50,
+		  store=psd_store.STORE, processes=1, exclude=exclusions.CALENDAR):
+	'''Profiles of the stations (default: all in the store) over the given years.
+
+	bands is a list of (low, high) periods in s, None for every period; days
+	an optional inclusive (first, last) day-of-year window.'''
+	years = [str(year) for year in years]
+	if stas is None:
+		stas = sorted(set().union(*[psd_store.stations(year, store) for year in years]))
+	first = next(((sta, year) for year in years for sta in psd_store.stations(year, store)), None)
+	if first is None:
+		raise ValueError(f'no PSDs in {store} for {years}')
+	periods = psd_store.load(*first, nper, store, exclude=None).periods
+	nper = len(periods)
+	bands = None if bands is None else [tuple(map(float, band)) for band in bands]
+	instrument.count(stations=len(stas), years=len(years))
+
+	values = []
+	for year in years:
+		jobs = [(stas[i:i + BATCH], year, nper, bands, days, q, store, exclude) for i in range(0, len(stas), BATCH)]
+		if processes > 1:
+			with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('fork')) as pool:
+				results = list(pool.map(_batch_job, jobs))
+		else:
+			results = [_batch_job(job) for job in jobs]
+		# Days the workers dropped through the exclusion calendar
+		for _, lost in results:
+			exclusions.lost.update(lost)
+		values.append(np.concatenate([out for out, _ in results]) if results else np.empty((0, HOURS, 0)))
+	return Profiles(years, list(stas), np.asarray(periods), None if bands is None else np.array(bands), np.stack(values))
+
+
+def save(prof, path=OUT):
+	with jsondb.atomic_open(path) as f:
+		np.savez(f, years=prof.years, stations=prof.stations, periods=prof.periods,
+				 bands=np.empty((0, 2)) if prof.bands is None else prof.bands, values=prof.values.astype(np.float32))
+	return path
+
+
+def load(path=OUT):
+	'''Profiles written by save().'''
+	with np.load(path) as res:
+		bands = res['bands'] if len(res['bands']) else None
+		return Profiles(res['years'].tolist(), res['stations'].tolist(), res['periods'], bands, res['values'])
+
+
+def station(prof, sta, year):
+	'''(hour, period or band) profile of one station and year.'''
+	return prof.values[prof.years.index(str(year)), prof.stations.index(sta)]
+
+
+def province(prof, name, year, q=50, sta_prov=None):
+	'''Percentile over the stations of a province of their (hour, period or band) profiles.'''
+	groups = provinces.by_province(prof.stations, sta_prov)
+	if name not in groups:
+		raise KeyError(f'no station of {name!r} in the profiles')
+	idx = [prof.stations.index(sta) for sta in groups[name]]
+	return psd_stats.hourly_percentiles(prof.values[prof.years.index(str(year)), idx], q)
+
+
+def _band(text):
+	lo, hi = text.split('-')
+	return float(lo), float(hi)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Hour-of-day median profiles of every station from the PSD store.')
+	parser.add_argument('--years', nargs='+', default=['2020', '2022'])
+	parser.add_argument('--bands', nargs='+', type=_band, help='period bands in s as low-high (default: every period)')
+	parser.add_argument('--days', nargs=2, type=int, metavar=('FIRST', 'LAST'), help='day-of-year window')
+	parser.add_argument('-q', type=float, default=50, help='percentile (default: median)')
+	parser.add_argument('-j', '--jobs', type=int, default=1, help='station batches processed concurrently')
+	parser.add_argument('--store', default=psd_store.STORE)
+	parser.add_argument('--out', default=OUT)
+	args = parser.parse_args()
+	prof = build(args.years, bands=args.bands, days=args.days, q=args.q, store=args.store, processes=args.jobs)
+	for msg in exclusions.report():
+		print(msg)
+	print(save(prof, args.out))
@@ -0,0 +1,48 @@
+'''Calendar of station days left out of every PSD reduction.
+
+exclusions.csv lists inclusive ranges of days of the year per station and
+year (maintenance, instrument swaps, known bad days)
+
+	Station,Year,First,Last,Reason
+	CLG1,2022,227,319,...
+
+mask() turns the ranges of a station and year into a boolean keep mask
+over any day array and remembers how many days were dropped, which
+report() lists.
+'''
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+
+CALENDAR = 'exclusions.csv'
+
+# (station, year) -> days dropped by the last mask()
+lost = {}
+
+
+@functools.lru_cache(maxsize=None)
+def load(path=CALENDAR):
+	'''(station, year) -> (n, 2) array of inclusive day ranges.'''
+	if not os.path.exists(path):
+		return {}
+	db = pd.read_csv(path, dtype={'Station': str, 'Year': str})
+	return {key: rows[['First', 'Last']].to_numpy(dtype=int)
+			for key, rows in db.groupby(['Station', 'Year'])}
+
+
+def mask(sta, year, days, path=CALENDAR):
+	'''Boolean array of the days of a station and year that are kept.'''
+	days = np.asarray(days, dtype=int)
+	ranges = load(path).get((sta, str(year)))
+	if ranges is None:
+		return np.ones(len(days), dtype=bool)
+	keep = ~((days[:, None] >= ranges[:, 0]) & (days[:, None] <= ranges[:, 1])).any(axis=1)
+	lost[(sta, str(year))] = int(len(days) - keep.sum())
+	return keep
+
+
+def report():
+	'''Lines "<station> <year>: <n> days excluded" for every masked station.'''
+	return [f'{sta} {year}: {n} days excluded' for (sta, year), n in sorted(lost.items())]
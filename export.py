@@ -0,0 +1,46 @@
+'''Write a figure in several formats.
+
+save() writes basename.<fmt> for every format and records the time as the
+save stage. With tight=True the bounding box is measured once, with the
+images (map backgrounds) hidden: savefig(bbox_inches='tight') measures it
+on a full draw per format, resampling every background image once more
+just to find the text and axes extents. PNGs come out pixel-identical to
+plain savefig; vector bounds match to a few hundredths of a point.
+
+	export.save(fig, 'Figures/Fig4')                      # Fig4.png + Fig4.svg
+	export.save(fig, 'Figures/Fig7', tight=False, formats=('png', 'svg', 'pdf'))
+'''
+import matplotlib.pyplot as plt
+from matplotlib.image import AxesImage
+
+import instrument
+
+FORMATS = ('png', 'svg')
+
+
+def tight_bbox(fig, dpi):
+	'''Tight bounding box of the figure in inches, padded as savefig pads it, without drawing its images.'''
+	images = [im for im in fig.findobj(AxesImage) if im.get_visible()]
+	old = fig.dpi
+	try:
+		for im in images:
+			im.set_visible(False)
+		fig.set_dpi(dpi)
+		# Runs the layout engine, as savefig would
+		fig.draw_without_rendering()
+		return fig.get_tightbbox(fig.canvas.get_renderer()).padded(plt.rcParams['savefig.pad_inches'])
+	finally:
+		fig.set_dpi(old)
+		for im in images:
+			im.set_visible(True)
+
+
+@instrument.timed('save')
+def save(fig, basename, formats=FORMATS, dpi=300, tight=True):
+	'''Write basename.<fmt> for every format; returns the written paths.'''
+	bbox = tight_bbox(fig, dpi) if tight else None
+	paths = []
+	for fmt in formats:
+		paths.append(f'{basename}.{fmt}')
+		fig.savefig(paths[-1], format=fmt, dpi=dpi, bbox_inches=bbox)
+	return paths
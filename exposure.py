@@ -0,0 +1,130 @@
+'''Population around every station, next to its lockdown power change.
+
+Population centres come from DBs/municipalities.csv (Territory, Lat, Lon,
+Value: one row per ISTAT municipality with its resident population).
+Without it the provinces of limits_IT_provinces.geojson stand in, placed
+at an interior point and carrying the population of
+DCIS_POPRES1_11092023115658356.csv.
+
+For every station, from one haversine BallTree query per tree:
+
+	Pop_<r>km     population of the centres within r km (RADII)
+	Nearest       nearest centre with at least LARGE residents
+	Dist_km       great-circle distance to it
+
+The centres within the largest radius are found once and summed per
+radius with np.bincount, so the cost grows with the number of stations
+and nearby centres, not stations x centres. table() adds the
+2022 - lockdown change of the yearly_median_ext_covid_diff periods and
+the result is written to DBs/exposure.csv for regression plots:
+
+	python exposure.py --radii 5 10 25 50 --large 100000
+'''
+import argparse
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from sklearn.neighbors import BallTree
+
+import instrument
+import jsondb
+import periods
+import provinces
+import stations
+
+MUNICIPALITIES = 'DBs/municipalities.csv'
+POPULATION = 'DBs/DCIS_POPRES1_11092023115658356.csv'
+DIFF = 'DBs/jsons/yearly_median_ext_covid_diff.json'
+OUT = 'DBs/exposure.csv'
+RADII = (5., 10., 25., 50.)
+LARGE = 100000
+EARTH_RADIUS = 6371.
+
+Centres = namedtuple('Centres', ['names', 'lats', 'lons', 'population'])
+
+
+def load_centres(path=MUNICIPALITIES, provinces_path=provinces.PROVINCES, population=POPULATION):
+	'''Population centres, the municipalities table or else the provinces.'''
+	if os.path.exists(path):
+		db = pd.read_csv(path)
+		return Centres(db['Territory'].to_numpy(dtype=object), db['Lat'].to_numpy(dtype=float),
+					   db['Lon'].to_numpy(dtype=float), db['Value'].to_numpy(dtype=float))
+	polygon = gpd.read_file(provinces_path)
+	pop = pd.read_csv(population).groupby('Territory')['Value'].sum()
+	pts = shapely.point_on_surface(polygon.geometry.values)
+	names = polygon.prov_name.to_numpy(dtype=object)
+	return Centres(names, shapely.get_y(pts), shapely.get_x(pts), pop.reindex(names).fillna(0).to_numpy(dtype=float))
+
+
+def _tree(lats, lons):
+	return BallTree(np.radians(np.column_stack([lats, lons])), metric='haversine')
+
+
+@instrument.timed('exposure')
+def exposure(lats, lons, centres, radii=RADII, large=LARGE):
+	'''DataFrame of the population within every radius and the nearest large centre of each point.
+
+	Points with NaN coordinates get NaN values.'''
+	lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+	ok = np.isfinite(lats) & np.isfinite(lons)
+	pts = np.radians(np.column_stack([lats[ok], lons[ok]]))
+	instrument.count(stations=int(ok.sum()), centres=len(centres.names))
+	out = {}
+
+	# Centres within the largest radius, summed per radius
+	radii = sorted(radii)
+	idx, dist = _tree(centres.lats, centres.lons).query_radius(pts, radii[-1] / EARTH_RADIUS, return_distance=True)
+	rows = np.repeat(np.arange(len(pts)), [len(i) for i in idx])
+	idx = np.concatenate(idx).astype(int) if len(idx) else np.empty(0, dtype=int)
+	dist = np.concatenate(dist) * EARTH_RADIUS if len(dist) else np.empty(0)
+	for r in radii:
+		near = dist <= r
+		col = np.full(len(lats), np.nan)
+		col[ok] = np.bincount(rows[near], weights=centres.population[idx[near]], minlength=len(pts))
+		out[f'Pop_{r:g}km'] = col
+
+	# Nearest large centre
+	big = np.flatnonzero(centres.population >= large)
+	nearest = np.full(len(lats), '', dtype=object)
+	dist_km = np.full(len(lats), np.nan)
+	if len(big) and len(pts):
+		d, i = _tree(centres.lats[big], centres.lons[big]).query(pts, k=1)
+		nearest[ok] = centres.names[big[i[:, 0]]]
+		dist_km[ok] = d[:, 0] * EARTH_RADIUS
+	out['Nearest'] = nearest
+	out['Dist_km'] = dist_km
+	return pd.DataFrame(out)
+
+
+def table(stas=None, diff=DIFF, radii=RADII, large=LARGE, centres=None, lo=None, hi=None):
+	'''Per-station exposure with the power change of every period from lo to hi s.
+
+	Stations default to those of the difference database.'''
+	db = jsondb.load(diff)
+	if stas is None:
+		stas = sorted(set().union(*[db[key] for key in db]))
+	lats, lons = stations.load().coords(stas)
+	centres = load_centres() if centres is None else centres
+	out = pd.concat([pd.DataFrame({'Station': stas, 'Lat': lats, 'Lon': lons}),
+					 exposure(lats, lons, centres, radii, large)], axis=1)
+	axis, vals = periods.table(db, stas, lo, hi)
+	change = pd.DataFrame(vals, columns=[f'Change_{p:g}' for p in axis])
+	return pd.concat([out, change], axis=1)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Population exposure of every station.')
+	parser.add_argument('--radii', type=float, nargs='+', default=list(RADII), help='radii in km')
+	parser.add_argument('--large', type=float, default=LARGE, help='residents of a large centre')
+	parser.add_argument('--lo', type=float, help='shortest period of the change columns (s)')
+	parser.add_argument('--hi', type=float, help='longest period of the change columns (s)')
+	parser.add_argument('--diff', default=DIFF)
+	parser.add_argument('--out', default=OUT)
+	args = parser.parse_args()
+	exp = table(diff=args.diff, radii=args.radii, large=args.large, lo=args.lo, hi=args.hi)
+	exp.to_csv(args.out, index=False)
+	print(f'{args.out}: {len(exp)} stations')
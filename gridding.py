@@ -0,0 +1,189 @@
+'''Interpolation of station values onto a regular lon/lat grid over the map extent.
+
+Stations and grid nodes are projected to km (equirectangular about the
+mid latitude) and the NEIGHBOURS nearest stations of every node come from
+one cKDTree query per batch of nodes. Nodes farther than MAX_DIST km from
+every station stay NaN, so the sea and empty areas are left blank.
+
+	idw       inverse distance weighting, weights 1 / d**POWER
+	kriging   ordinary kriging on the neighbours with an exponential
+	          variogram fitted to the station pairs; nodes with the same
+	          neighbours share one kriging matrix, and the distinct
+	          matrices of a batch are inverted in one np.linalg.inv
+
+cached_grid() keeps the grid of a (product, period, method) in
+DBs/grids/<product>.<period>.<method>.npz and recomputes it when the
+stations, values or settings change.
+
+	grid = gridding.cached_grid('day_ext_diff', '0.25', stlos, stlas, dif, 'kriging')
+	bmap.draw(ax, stlos, stlas, dif, vmin, vmax, grid=grid)
+'''
+import hashlib
+import os
+from collections import namedtuple
+
+import numpy as np
+from scipy.optimize import curve_fit
+from scipy.spatial import cKDTree
+from scipy.spatial.distance import pdist
+
+import instrument
+import jsondb
+import tiles
+
+GRIDS = 'DBs/grids'
+RES = 0.01
+NEIGHBOURS = 12
+MAX_DIST = 50.
+POWER = 2
+BATCH = 1 << 14
+EARTH_RADIUS = 6371.
+METHODS = ('idw', 'kriging')
+
+Grid = namedtuple('Grid', ['lons', 'lats', 'values'])
+
+
+def grid_axes(extent=tiles.EXTENT, res=RES):
+	'''Node longitudes and latitudes of the grid over a lon/lat extent.'''
+	lon0, lon1, lat0, lat1 = extent
+	return np.arange(lon0, lon1 + res / 2, res), np.arange(lat0, lat1 + res / 2, res)
+
+
+def project(lons, lats, lat0):
+	'''(n, 2) km coordinates, equirectangular about lat0.'''
+	lons, lats = np.radians(lons), np.radians(lats)
+	return EARTH_RADIUS * np.column_stack([lons * np.cos(np.radians(lat0)), lats])
+
+
+def _exponential(h, nugget, sill, rng):
+	return nugget + sill * (1 - np.exp(-h / rng))
+
+
+def variogram(xy, values, nlags=15, max_lag=None):
+	'''(nugget, sill, range) of an exponential model fitted to the empirical semivariogram.'''
+	dist = pdist(xy)
+	semi = 0.5 * pdist(values[:, None], 'sqeuclidean')
+	max_lag = max_lag or dist.max() / 2
+	edges = np.linspace(0, max_lag, nlags + 1)
+	idx = np.digitize(dist, edges) - 1
+	ok = (idx >= 0) & (idx < nlags)
+	n = np.bincount(idx[ok], minlength=nlags)
+	gamma = np.bincount(idx[ok], weights=semi[ok], minlength=nlags) / np.maximum(n, 1)
+	lags = (edges[:-1] + edges[1:]) / 2
+	var = np.var(values)
+	guess = (0.1 * var, var, max_lag / 3)
+	try:
+		params, _ = curve_fit(_exponential, lags[n > 0], gamma[n > 0], p0=guess,
+							  bounds=([0, 1e-9, 1e-3], [np.inf, np.inf, np.inf]), sigma=1 / np.sqrt(n[n > 0]))
+		return tuple(params)
+	except (RuntimeError, ValueError):
+		return guess
+
+
+def _query(tree, nodes, k, max_dist):
+	dist, idx = tree.query(nodes, k=k, distance_upper_bound=max_dist, workers=-1)
+	return dist.reshape(len(nodes), -1), idx.reshape(len(nodes), -1)
+
+
+def idw(xy, values, nodes, k=NEIGHBOURS, max_dist=MAX_DIST, power=POWER):
+	'''Inverse distance weighted values at the nodes, NaN without a station within max_dist.'''
+	tree = cKDTree(xy)
+	out = np.full(len(nodes), np.nan)
+	k = min(k, len(xy))
+	for start in range(0, len(nodes), BATCH):
+		dist, idx = _query(tree, nodes[start:start + BATCH], k, max_dist)
+		valid = np.isfinite(dist)
+		w = np.where(valid, 1 / np.maximum(dist, 1e-6) ** power, 0)
+		vals = values[np.minimum(idx, len(values) - 1)]
+		wsum = w.sum(axis=1)
+		with np.errstate(invalid='ignore', divide='ignore'):
+			out[start:start + BATCH] = np.where(wsum > 0, (w * vals).sum(axis=1) / wsum, np.nan)
+	return out
+
+
+def kriging(xy, values, nodes, k=NEIGHBOURS, max_dist=MAX_DIST, model=None):
+	'''Ordinary kriging estimates at the nodes from their k nearest stations.
+
+	Without a model and with fewer than two distinct station positions there
+	is no variogram to fit, and the nodes get the IDW estimate (the value of
+	the station within max_dist) instead.'''
+	if model is None and len(np.unique(xy, axis=0)) < 2:
+		return idw(xy, values, nodes, k, max_dist)
+	nugget, sill, rng = variogram(xy, values) if model is None else model
+
+	def gamma(h):
+		return np.where(h > 0, _exponential(h, nugget, sill, rng), 0.)
+
+	tree = cKDTree(xy)
+	out = np.full(len(nodes), np.nan)
+	k = min(k, len(xy))
+	for start in range(0, len(nodes), BATCH):
+		dist, idx = _query(tree, nodes[start:start + BATCH], k, max_dist)
+		valid = np.isfinite(dist)
+		rows = np.flatnonzero(valid.any(axis=1))
+		if not len(rows):
+			continue
+		# Neighbour sets sorted by station, missing neighbours (index n) last
+		order = np.argsort(idx[rows], axis=1)
+		idx = np.take_along_axis(idx[rows], order, axis=1)
+		dist = np.take_along_axis(dist[rows], order, axis=1)
+		valid = idx < len(xy)
+		# Nearby nodes share their neighbours, so every system is inverted once
+		sets, inv = np.unique(idx, axis=0, return_inverse=True)
+		inv = inv.ravel()
+		set_valid = sets < len(xy)
+		pts = xy[np.minimum(sets, len(xy) - 1)]
+		pair = set_valid[:, :, None] & set_valid[:, None, :]
+		A = np.zeros((len(sets), k + 1, k + 1))
+		A[:, :k, :k] = np.where(pair, gamma(np.linalg.norm(pts[:, :, None] - pts[:, None, :], axis=-1)), 0)
+		# Missing neighbours get an identity row and no weight
+		A[:, np.arange(k), np.arange(k)] += ~set_valid
+		A[:, :k, k] = set_valid
+		A[:, k, :k] = set_valid
+		b = np.zeros((len(rows), k + 1))
+		b[:, :k] = np.where(valid, gamma(np.where(valid, dist, 0)), 0)
+		b[:, k] = 1
+		w = np.einsum('nij,nj->ni', np.linalg.inv(A)[inv], b)
+		out[start + rows] = (w[:, :k] * values[np.minimum(idx, len(xy) - 1)]).sum(axis=1)
+	return out
+
+
+@instrument.timed('grid')
+def grid(stlos, stlas, values, method='idw', extent=tiles.EXTENT, res=RES, k=NEIGHBOURS, max_dist=MAX_DIST):
+	'''Interpolate station values onto the grid of an extent, (lat, lon) values.'''
+	stlos, stlas, values = (np.asarray(a, dtype=float) for a in (stlos, stlas, values))
+	ok = np.isfinite(stlos) & np.isfinite(stlas) & np.isfinite(values)
+	lons, lats = grid_axes(extent, res)
+	lat0 = (extent[2] + extent[3]) / 2
+	glon, glat = np.meshgrid(lons, lats)
+	nodes = project(glon.ravel(), glat.ravel(), lat0)
+	instrument.count(stations=int(ok.sum()), nodes=len(nodes))
+	if not ok.any():
+		return Grid(lons, lats, np.full(glon.shape, np.nan))
+	xy = project(stlos[ok], stlas[ok], lat0)
+	if method == 'idw':
+		est = idw(xy, values[ok], nodes, k, max_dist)
+	elif method == 'kriging':
+		est = kriging(xy, values[ok], nodes, k, max_dist)
+	else:
+		raise ValueError(f'unknown method {method!r}, choose from {METHODS}')
+	return Grid(lons, lats, est.reshape(glon.shape))
+
+
+def cached_grid(product, period, stlos, stlas, values, method='idw', directory=GRIDS, **kwargs):
+	'''grid() of a (product, period), read from directory when its inputs are unchanged.'''
+	sha = hashlib.sha1()
+	for arr in (stlos, stlas, values):
+		sha.update(np.ascontiguousarray(arr, dtype=float).tobytes())
+	sha.update(repr((method, sorted(kwargs.items()))).encode())
+	key = sha.hexdigest()
+	path = os.path.join(directory, f'{product}.{period}.{method}.npz')
+	if os.path.exists(path):
+		with np.load(path) as cached:
+			if str(cached['key']) == key:
+				return Grid(cached['lons'], cached['lats'], cached['values'])
+	out = grid(stlos, stlas, values, method, **kwargs)
+	os.makedirs(directory, exist_ok=True)
+	with jsondb.atomic_open(path) as f:
+		np.savez(f, key=key, lons=out.lons, lats=out.lats, values=out.values.astype(np.float32))
+	return out
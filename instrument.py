@@ -0,0 +1,128 @@
+'''Stage timing and memory accounting for the figure scripts.
+
+A figure script calls start() first and report() last. In between, the
+library functions it uses record their stages (JSON loading, station
+lookups, npz reading, medians, tiles, rendering, saving) with
+
+	with instrument.stage('render'):
+		...
+	@instrument.timed('json')
+	def load(path): ...
+	instrument.count(stations=len(stas), files=1)
+
+Stages nest ('render/tiles') and repeated calls of a stage are summed, so
+a run over thousands of files still gives one record per stage with its
+calls, wall time, peak RSS, RSS growth and counts. report() appends the
+run as one JSON line to Figures/reports/<name>.jsonl. A run that stops
+before report() (an exception, or the next start()) is still written, with
+complete set to false. Work done in forked workers only shows up as the
+wall time of the stage that waits for them.
+'''
+import atexit
+import functools
+import json
+import os
+import resource
+import sys
+import time
+from datetime import datetime
+
+REPORTS = 'Figures/reports'
+
+_run = {}
+_stages = {}
+_stack = []
+_counts = {}
+
+
+def peak_rss_mb():
+	'''Peak resident set size of this process so far, in MB.'''
+	rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# kB on Linux, bytes on macOS
+	return rss / (1 << 20) if sys.platform == 'darwin' else rss / 1024
+
+
+def start(name):
+	'''Begin the run of a figure and forget the stages of any earlier run.'''
+	_flush()
+	_run.clear()
+	_run.update(name=name, started=datetime.now().isoformat(timespec='seconds'), t0=time.perf_counter())
+	_stages.clear()
+	_counts.clear()
+	del _stack[:]
+
+
+def count(**counts):
+	'''Add item counts to the innermost open stage (to the run outside of stages).'''
+	target = _stages[_stack[-1]]['counts'] if _stack else _counts
+	for key, n in counts.items():
+		target[key] = target.get(key, 0) + n
+
+
+class stage(object):
+	'''Context manager adding one call of a named stage.'''
+
+	def __init__(self, name, **counts):
+		self.name = name
+		self.counts = counts
+
+	def __enter__(self):
+		self.path = '/'.join([_stack[-1], self.name]) if _stack else self.name
+		_stages.setdefault(self.path, {'calls': 0, 'wall': 0., 'peak_rss_mb': 0., 'rss_growth_mb': 0., 'counts': {}})
+		_stack.append(self.path)
+		count(**self.counts)
+		self.rss0 = peak_rss_mb()
+		self.t0 = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		wall = time.perf_counter() - self.t0
+		peak = peak_rss_mb()
+		rec = _stages[self.path]
+		rec['calls'] += 1
+		rec['wall'] += wall
+		rec['peak_rss_mb'] = max(rec['peak_rss_mb'], peak)
+		rec['rss_growth_mb'] += peak - self.rss0
+		_stack.pop()
+		return False
+
+
+def timed(name):
+	'''Decorator running every call of a function as a stage.'''
+	def wrap(func):
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			with stage(name):
+				return func(*args, **kwargs)
+		return wrapper
+	return wrap
+
+
+def report(directory=REPORTS, complete=True):
+	'''Append the run to <directory>/<name>.jsonl and return it as a dict.'''
+	_run['reported'] = True
+	name = _run.get('name') or os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'run'
+	run = {
+		'name': name,
+		'started': _run.get('started'),
+		'complete': complete,
+		'wall': round(time.perf_counter() - _run['t0'], 4) if 't0' in _run else None,
+		'peak_rss_mb': round(peak_rss_mb(), 1),
+		'counts': dict(_counts),
+		'stages': {path: dict(rec, wall=round(rec['wall'], 4), peak_rss_mb=round(rec['peak_rss_mb'], 1),
+							  rss_growth_mb=round(rec['rss_growth_mb'], 1))
+				   for path, rec in _stages.items()},
+	}
+	os.makedirs(directory, exist_ok=True)
+	with open(os.path.join(directory, name + '.jsonl'), 'a') as f:
+		f.write(json.dumps(run) + '\n')
+	return run
+
+
+def _flush():
+	# Write a started run that never reached report()
+	if _run and not _run.get('reported'):
+		report(complete=False)
+
+
+atexit.register(_flush)
@@ -0,0 +1,199 @@
+'''Lazy loader for the period -> station -> value(s) JSON databases in DBs/jsons.
+
+The first load of a JSON file converts it to an uncompressed npz next to
+it (DBs/jsons/.cache/<name>.npz) with, for every period, the station codes
+and their values flattened into one float array plus offsets for the
+per-sample files. Later loads open the npz and decode a period only when
+it is indexed, so
+
+	db = load('DBs/jsons/day_ext.json')
+	db['0.25']['PTF']
+
+reads the station table and values of '0.25' and nothing else. Scalar
+values come back as floats, sample lists as float arrays. The npz is
+rebuilt whenever the size or modification time of the JSON changes.
+Decoded periods are kept, so loading the same file twice in a process
+costs nothing.
+'''
+import contextlib
+import json
+import os
+import tempfile
+from collections.abc import Mapping
+
+import numpy as np
+
+import instrument
+
+
+# Read once, os.umask can only be queried by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextlib.contextmanager
+def atomic_open(path, mode='wb'):
+	'''File object on a uniquely named temporary file next to path, moved over path on success.
+
+	Processes writing the same path concurrently never see or replace each
+	other's partial files, and readers only ever see a complete file.'''
+	fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.tmp')
+	try:
+		with os.fdopen(fd, mode) as f:
+			yield f
+		# mkstemp creates the file private, give it the permissions open() would
+		os.chmod(tmp, 0o666 & ~_UMASK)
+		os.replace(tmp, path)
+	except BaseException:
+		with contextlib.suppress(FileNotFoundError):
+			os.remove(tmp)
+		raise
+
+
+def cache_path(path):
+	root, name = os.path.split(path)
+	return os.path.join(root, '.cache', os.path.splitext(name)[0] + '.npz')
+
+
+def stamp(path):
+	'''(size, mtime in ns) of a file, what a converted npz was built from.'''
+	st = os.stat(path)
+	return [st.st_size, st.st_mtime_ns]
+
+
+def convert(path, out=None, sha1=''):
+	'''Write the npz form of a JSON database and return its path.
+
+	The npz records the stamp() of the JSON it was read from and, when
+	given, its SHA-1.'''
+	out = out or cache_path(path)
+	source = stamp(path)
+	with open(path) as f:
+		data = json.load(f)
+	arrays = {'periods': np.array(list(data), dtype=str), 'source': np.array(source, dtype=np.int64),
+			  'sha1': np.array(sha1)}
+	for i, (period, stas) in enumerate(data.items()):
+		vals = list(stas.values())
+		arrays[f'stas_{i}'] = np.array(list(stas), dtype=str)
+		if all(not isinstance(val, list) for val in vals):
+			arrays[f'values_{i}'] = np.array(vals, dtype=float)
+		else:
+			vals = [val if isinstance(val, list) else [val] for val in vals]
+			arrays[f'offsets_{i}'] = np.cumsum([0] + [len(val) for val in vals])
+			arrays[f'values_{i}'] = np.array([v for val in vals for v in val], dtype=float)
+	os.makedirs(os.path.dirname(out), exist_ok=True)
+	with atomic_open(out) as f:
+		np.savez(f, **arrays)
+	return out
+
+
+class PeriodView(Mapping):
+	'''Station -> value(s) of one period.'''
+
+	def __init__(self, stas, values, offsets=None):
+		self.stas = stas
+		self.values = values
+		self.offsets = offsets
+		self.pos = {sta: i for i, sta in enumerate(stas.tolist())}
+
+	def __getitem__(self, sta):
+		i = self.pos[sta]
+		if self.offsets is None:
+			return float(self.values[i])
+		return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+	def __iter__(self):
+		return iter(self.pos)
+
+	def __len__(self):
+		return len(self.pos)
+
+	def __contains__(self, sta):
+		return sta in self.pos
+
+
+class JsonDB(Mapping):
+	'''Period -> PeriodView, decoded on first access.'''
+
+	def __init__(self, npz):
+		self.path = npz
+		self._npz = None
+		self._pid = None
+		self.periods = self.npz['periods'].tolist()
+		files = self.npz.files
+		self.source = self.npz['source'].tolist() if 'source' in files else None
+		self.sha1 = str(self.npz['sha1']) if 'sha1' in files else ''
+		self.index = {period: i for i, period in enumerate(self.periods)}
+		self._views = {}
+
+	@property
+	def npz(self):
+		# A forked process must not share the parent's file offset
+		if self._pid != os.getpid():
+			self._npz = np.load(self.path)
+			self._pid = os.getpid()
+		return self._npz
+
+	def __getitem__(self, period):
+		if period not in self._views:
+			with instrument.stage('json', periods=1):
+				i = self.index[period]
+				offsets = self.npz[f'offsets_{i}'] if f'offsets_{i}' in self.npz.files else None
+				self._views[period] = PeriodView(self.npz[f'stas_{i}'], self.npz[f'values_{i}'], offsets)
+		return self._views[period]
+
+	def __iter__(self):
+		return iter(self.periods)
+
+	def __len__(self):
+		return len(self.periods)
+
+	def __contains__(self, period):
+		return period in self.index
+
+	def table(self, stas, periods=None):
+		'''(station, period) array of scalar values, NaN where a station is missing.
+
+		Raises ValueError on databases of sample lists, reduce those with
+		statcache.station_stats instead.'''
+		periods = self.periods if periods is None else periods
+		out = np.full((len(stas), len(periods)), np.nan)
+		for j, period in enumerate(periods):
+			view = self[period]
+			if view.offsets is not None:
+				raise ValueError(f'{self.path} holds sample lists, not one value per station')
+			idx = np.array([view.pos.get(sta, -1) for sta in stas], dtype=int)
+			found = idx >= 0
+			out[found, j] = view.values[idx[found]]
+		return out
+
+
+_opened = {}
+
+
+def _fresh(db, source, sha1):
+	return db.source == source and (not sha1 or db.sha1 == sha1)
+
+
+@instrument.timed('json')
+def load(path, sha1=None):
+	'''Open a JSON database through its npz form, converting it if needed.
+
+	The npz is rebuilt whenever the size or modification time of the JSON
+	differs from the ones it was built from (older as well as newer, as
+	after cp -p or unpacking an archive), or, with sha1, when it was not
+	built from JSON content with that SHA-1. Databases are opened once per
+	process and JSON stamp.'''
+	source = stamp(path)
+	key = (os.path.abspath(path),) + tuple(source)
+	db = _opened.get(key)
+	if db is None or not _fresh(db, source, sha1):
+		npz = cache_path(path)
+		db = JsonDB(npz) if os.path.exists(npz) else None
+		if db is None or not _fresh(db, source, sha1):
+			convert(path, npz, sha1 or '')
+			instrument.count(converted=1)
+			db = JsonDB(npz)
+		instrument.count(files=1)
+		_opened[key] = db
+	return db
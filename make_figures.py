@@ -0,0 +1,206 @@
+'''Regenerate the figures whose inputs or code changed.
+
+Every figure is listed in FIGURES with its script, input files and outputs.
+A figure is stale when one of its outputs is missing or when the digest of
+its inputs, its script and the local modules the script imports differs
+from the one recorded in Figures/.stamps.json after its last successful
+run. Shared inputs (station attributes, station lists, yearly-median JSONs)
+are loaded once in this process and the stale figures then run in forked
+workers that inherit them.
+
+	python make_figures.py              # every stale figure
+	python make_figures.py Fig4 Fig5    # only these, if stale
+	python make_figures.py --force -j 4
+	python make_figures.py --dry-run
+'''
+import argparse
+import ast
+import hashlib
+import json
+import multiprocessing
+import os
+import runpy
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+STAMPS = 'Figures/.stamps.json'
+
+FIGURES = {
+	'Fig1': dict(script='Figure1-S1.py',
+				 inputs=['DBs/jsons/yearly_median_ext.json', 'DBs/jsons/yearly_median_ext_covid.json',
+						 'DBs/ninetyplus.csv', 'DBs/station_attributes.csv', 'DBs/it_model.csv'],
+				 outputs=['Figures/Fig1.png', 'Figures/Fig1.svg']),
+	'Fig3': dict(script='Figure3a-d.py',
+				 inputs=['DBs/jsons/yearly_median_ext_covid_diff.json',
+						 'DBs/ninetyplus.csv', 'DBs/station_attributes.csv'],
+				 outputs=['Figures/Fig3.png', 'Figures/Fig3.svg']),
+	'Fig4': dict(script='Figure4-S4.py',
+				 inputs=['DBs/jsons/day_ext.json', 'DBs/jsons/day_ext_covid.json',
+						 'DBs/jsons/night_ext.json', 'DBs/jsons/night_ext_covid.json',
+						 'DBs/ninetyplus.csv', 'DBs/station_attributes.csv'],
+				 outputs=['Figures/Fig4.png', 'Figures/Fig4.svg']),
+	'Fig5': dict(script='Fig5-S5.py',
+				 inputs=['DBs/jsons/wd_ext.json', 'DBs/jsons/wd_ext_covid.json',
+						 'DBs/jsons/we_ext.json', 'DBs/jsons/we_ext_covid.json',
+						 'DBs/ninetyplus.csv', 'DBs/station_attributes.csv'],
+				 outputs=['Figures/Fig5.png', 'Figures/Fig5.svg']),
+	'Fig7': dict(script='Figure7.py',
+				 inputs=['DBs/jsons/yearly_median_ext_covid_diff.json', 'DBs/completeness.csv',
+						 'DBs/station_attributes.csv', 'DBs/limits_IT_provinces.geojson',
+						 'DBs/DCIS_POPRES1_11092023115658356.csv',
+						 'DBs/sens_only/2020', 'DBs/sens_only/2022', 'exclusions.csv'],
+				 outputs=['Figures/Fig7.png', 'Figures/Fig7.svg']),
+	'Fig8': dict(script='Figure8.py',
+				 inputs=['DBs/jsons/yearly_median_all.json', 'DBs/jsons/yearly_median_all_covid.json',
+						 'DBs/italian_model.csv', 'DBs/ninetyplus.csv', 'DBs/brune-all.csv'],
+				 outputs=['Figures/Fig8.png', 'Figures/Fig8.svg']),
+}
+
+
+def local_modules(script, seen=None):
+	'''The script and every module of this directory it imports, recursively.'''
+	seen = set() if seen is None else seen
+	if script in seen:
+		return seen
+	seen.add(script)
+	with open(script) as f:
+		tree = ast.parse(f.read())
+	for node in ast.walk(tree):
+		if isinstance(node, ast.Import):
+			names = [alias.name for alias in node.names]
+		elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+			names = [node.module]
+		else:
+			continue
+		for name in names:
+			path = name.split('.')[0] + '.py'
+			if os.path.exists(path):
+				local_modules(path, seen)
+	return seen
+
+
+def file_hash(path):
+	if os.path.isdir(path):
+		# Directory trees (sens_only) are tracked by their listing
+		sha = hashlib.sha1()
+		for root, dirs, files in os.walk(path):
+			dirs.sort()
+			for name in sorted(files):
+				st = os.stat(os.path.join(root, name))
+				sha.update(f'{os.path.relpath(os.path.join(root, name), path)} {st.st_size} {st.st_mtime_ns}\n'.encode())
+		return sha.hexdigest()
+	if not os.path.exists(path):
+		return None
+	if not path.startswith('DBs/'):
+		# Small tracked files such as exclusions.csv, no hash sidecar in the repo
+		return code_hash(path)
+	import statcache
+	return statcache.content_hash(path)
+
+
+def code_hash(path):
+	with open(path, 'rb') as f:
+		return hashlib.sha1(f.read()).hexdigest()
+
+
+def digest(fig):
+	spec = FIGURES[fig]
+	hashes = [(path, file_hash(path)) for path in sorted(spec['inputs'])]
+	hashes += [(path, code_hash(path)) for path in sorted(local_modules(spec['script']))]
+	return hashlib.sha1(json.dumps(hashes).encode()).hexdigest()
+
+
+def read_stamps():
+	if not os.path.exists(STAMPS):
+		return {}
+	with open(STAMPS) as f:
+		return json.load(f)
+
+
+def stale(figs, stamps):
+	out = {}
+	for fig in figs:
+		dig = digest(fig)
+		missing = not all(os.path.exists(path) for path in FIGURES[fig]['outputs'])
+		if missing or stamps.get(fig) != dig:
+			out[fig] = dig
+	return out
+
+
+def preload(figs):
+	'''Load the inputs shared by the figures once, before the workers fork.'''
+	import jsondb
+	import selection
+	import stations
+	inputs = {path for fig in figs for path in FIGURES[fig]['inputs']}
+	if 'DBs/station_attributes.csv' in inputs:
+		stations.load()
+	if 'DBs/ninetyplus.csv' in inputs:
+		selection.ninetyplus()
+	if 'DBs/completeness.csv' in inputs:
+		selection.complete()
+	for path in sorted(inputs):
+		if os.path.basename(path).startswith('yearly_median') and os.path.exists(path):
+			db = jsondb.load(path)
+			for period in db:
+				db[period]
+
+
+def run(fig):
+	'''Run one figure script; returns (fig, error traceback or None).'''
+	import matplotlib
+	matplotlib.use('Agg')
+	import matplotlib.pyplot as plt
+	# Scripts with their own options must not see the runner's arguments
+	sys.argv = [FIGURES[fig]['script']]
+	try:
+		runpy.run_path(FIGURES[fig]['script'], run_name='__main__')
+		return fig, None
+	except BaseException:
+		return fig, traceback.format_exc()
+	finally:
+		plt.close('all')
+
+
+def make(figs=None, force=False, jobs=None, dry_run=False):
+	figs = list(FIGURES) if not figs else figs
+	stamps = read_stamps()
+	todo = {fig: digest(fig) for fig in figs} if force else stale(figs, stamps)
+	for fig in figs:
+		print(f'{fig}: {"stale" if fig in todo else "up to date"}')
+	if dry_run or not todo:
+		return todo
+
+	os.makedirs('Figures', exist_ok=True)
+	preload(todo)
+	jobs = jobs or min(len(todo), os.cpu_count() or 1)
+	if jobs > 1:
+		with ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context('fork')) as pool:
+			results = list(pool.map(run, todo))
+	else:
+		results = [run(fig) for fig in todo]
+
+	failed = []
+	for fig, error in results:
+		if error is None:
+			stamps[fig] = todo[fig]
+		else:
+			failed.append(fig)
+			print(f'{fig} failed:\n{error}')
+	with open(STAMPS, 'w') as f:
+		json.dump(stamps, f, indent=1)
+	return {fig: dig for fig, dig in todo.items() if fig not in failed}
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Regenerate stale figures.')
+	parser.add_argument('figures', nargs='*', help='figures to consider, e.g. Fig4 (default: all)')
+	parser.add_argument('--force', action='store_true', help='run even if up to date')
+	parser.add_argument('-j', '--jobs', type=int, default=None, help='concurrent figures')
+	parser.add_argument('--dry-run', action='store_true', help='only report which figures are stale')
+	args = parser.parse_args()
+	unknown = [fig for fig in args.figures if fig not in FIGURES]
+	if unknown:
+		parser.error(f'unknown figures {unknown}, choose from {list(FIGURES)}')
+	make(args.figures, args.force, args.jobs, args.dry_run)
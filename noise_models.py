@@ -0,0 +1,111 @@
+'''Reference noise models evaluated on whole period arrays.
+
+All models return acceleration power in dB rel. 1 (m/s^2)^2/Hz and NaN
+outside their period range.
+
+	nlnm, nhnm      Peterson (1993) new low/high noise models
+	alnm, ahnm      accelerometer low/high noise models (as in Figure8.py)
+	ItalianModel    Fornasari et al. (2022) IALNM/IAHNM/Median from
+	                italian_model.csv or it_model.csv
+
+exceedance() scores a (station, period) array of PSD values against any
+of them in one array operation.
+'''
+import numpy as np
+import pandas as pd
+
+# Peterson (1993): power = A + B log10(P) from each period up to the next
+NLNM_P = np.array([0.10, 0.17, 0.40, 0.80, 1.24, 2.40, 4.30, 5.00, 6.00, 10.00, 12.00,
+				   15.60, 21.90, 31.60, 45.00, 70.00, 101.00, 154.00, 328.00, 600.00, 10000.00, 100000.00])
+NLNM_A = np.array([-162.36, -166.70, -170.00, -166.40, -168.60, -159.98, -141.10, -71.36, -97.26, -132.18, -205.27,
+				   -37.65, -114.37, -160.58, -187.50, -216.47, -185.00, -168.34, -217.43, -258.28, -346.88])
+NLNM_B = np.array([5.64, 0.00, -8.30, 28.90, 52.48, 29.81, 0.00, -99.77, -66.49, -31.57, 36.16,
+				   -104.33, -47.10, -16.28, 0.00, 15.70, 0.00, -7.61, 11.90, 26.60, 48.75])
+NHNM_P = np.array([0.10, 0.22, 0.32, 0.80, 3.80, 4.60, 6.30, 7.90, 15.40, 20.00, 354.80, 100000.00])
+NHNM_A = np.array([-108.73, -150.34, -122.31, -116.85, -108.48, -74.66, 0.66, -93.37, 73.54, -151.52, -206.66])
+NHNM_B = np.array([-17.23, -80.50, -23.87, 32.51, 18.08, -32.95, -127.18, -22.42, -162.98, 10.01, 31.63])
+
+# Accelerometer noise models, linear in dB between the listed periods
+ALNM_P = np.array([0.01, 1., 10., 150.])
+ALNM_DB = np.array([-135., -135., -130., -118.25])
+AHNM_P = np.array([0.01, 0.1, 0.22, 0.32, 0.80, 3.8, 4.6, 6.3, 7.1, 150.])
+AHNM_DB = np.array([-91.5, -91.5, -97.41, -110.5, -120., -98., -96.5, -101., -105., -91.25])
+
+
+def _peterson(periods, P, A, B):
+	periods = np.asarray(periods, dtype=float)
+	idx = np.clip(np.searchsorted(P, periods, side='right') - 1, 0, len(A) - 1)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		out = A[idx] + B[idx] * np.log10(periods)
+	return np.where((periods >= P[0]) & (periods <= P[-1]), out, np.nan)
+
+
+def _linear(periods, P, db):
+	return np.interp(np.asarray(periods, dtype=float), P, db, left=np.nan, right=np.nan)
+
+
+def nlnm(periods):
+	return _peterson(periods, NLNM_P, NLNM_A, NLNM_B)
+
+
+def nhnm(periods):
+	return _peterson(periods, NHNM_P, NHNM_A, NHNM_B)
+
+
+def alnm(periods):
+	return _linear(periods, ALNM_P, ALNM_DB)
+
+
+def ahnm(periods):
+	return _linear(periods, AHNM_P, AHNM_DB)
+
+
+class ItalianModel(object):
+	'''Fornasari et al. (2022) Italian accelerometric noise models from a CSV table.
+
+	Both the comma separated italian_model.csv and the semicolon separated
+	it_model.csv are accepted; curves missing from the file give NaN.'''
+
+	def __init__(self, path='DBs/italian_model.csv'):
+		db = pd.read_csv(path, sep=None, engine='python').sort_values('Period')
+		self.db = db
+		self.period = db['Period'].to_numpy(dtype=float)
+		self.curves = {name: db[name].to_numpy(dtype=float) for name in ('IALNM', 'IAHNM', 'Median') if name in db}
+
+	def curve(self, name, periods):
+		if name not in self.curves:
+			return np.full(np.shape(periods), np.nan)
+		return _linear(periods, self.period, self.curves[name])
+
+	def ialnm(self, periods):
+		return self.curve('IALNM', periods)
+
+	def iahnm(self, periods):
+		return self.curve('IAHNM', periods)
+
+	def median(self, periods):
+		return self.curve('Median', periods)
+
+
+def exceedance(values, periods, model):
+	'''dB above (positive) or below (negative) a model for every station and period.
+
+	values is a (station, period) array, or (period,) for one station.'''
+	return np.asarray(values, dtype=float) - model(periods)
+
+
+def outside(values, periods, low, high):
+	'''dB outside the band between two models: above high (> 0), below low (< 0), 0 inside.'''
+	above = np.atleast_1d(exceedance(values, periods, high))
+	below = np.atleast_1d(exceedance(values, periods, low))
+	out = np.where(above > 0, above, np.where(below < 0, below, 0.))
+	out[np.isnan(above) & np.isnan(below)] = np.nan
+	return out
+
+
+def rank(values, periods, low, high):
+	'''Station order from the noisiest to the quietest relative to a model band.
+
+	Returns (order, score), score being the mean dB outside the band per station.'''
+	score = np.nanmean(outside(values, periods, low, high), axis=-1)
+	return np.argsort(-np.nan_to_num(score, nan=-np.inf), kind='stable'), score
@@ -0,0 +1,83 @@
+'''Assembly of the multi-panel station maps.
+
+Every figure script describes its panels as a list of dicts, in the order
+of the subplot grid, with the keyword arguments of BaseMap.draw plus
+
+	letter       annotation letter, e.g. 'a)'
+	letter_xy    its position in axes coordinates
+	letter_size  its font size
+	texts        extra (x, y, text, size) annotations in axes coordinates
+
+assemble() draws them on one plt.subplots figure, or, with PANEL_PROCESSES
+set to a number of processes, renders every panel in a process pool as a
+raster fragment and composites the fragments on the same grid. The pool
+is forked after the background has been merged, so the workers reuse it.
+'''
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import matplotlib.pyplot as plt
+from PIL import Image
+
+import basemap
+import export
+import instrument
+
+PROCESSES = int(os.environ.get('PANEL_PROCESSES', '0') or 0)
+
+_bmap = None
+
+
+def draw_panel(bmap, ax, panel):
+	panel = dict(panel)
+	letter = panel.pop('letter', None)
+	letter_x, letter_y = panel.pop('letter_xy', (-0.1, 1.02))
+	letter_size = panel.pop('letter_size', 12)
+	texts = panel.pop('texts', [])
+	bmap.draw(ax, **panel)
+	if letter:
+		ax.text(letter_x, letter_y, letter, transform=ax.transAxes, size=letter_size)
+	for x, y, text, size in texts:
+		ax.text(x, y, text, transform=ax.transAxes, size=size)
+
+
+def _render_panel(args):
+	panel, size, dpi = args
+	fig, ax = plt.subplots(figsize=size, subplot_kw={'projection': _bmap.crs})
+	draw_panel(_bmap, ax, panel)
+	buf = io.BytesIO()
+	fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
+	plt.close(fig)
+	return np.array(Image.open(buf))
+
+
+def assemble(panels, nrows, ncols, figsize, basename, processes=None, wspace=0, hspace=0.1, dpi=300, bmap=None):
+	'''Draw the panels on an nrows x ncols grid and save basename.png/.svg.'''
+	global _bmap
+	_bmap = bmap if bmap is not None else basemap.BaseMap()
+	processes = PROCESSES if processes is None else processes
+
+	if processes < 2:
+		fig, axs = plt.subplots(nrows, ncols, figsize=figsize, facecolor='w', edgecolor='k', subplot_kw={'projection': _bmap.crs}, gridspec_kw={'wspace': wspace, 'hspace': hspace})
+		for ax, panel in zip(axs.ravel(), panels):
+			draw_panel(_bmap, ax, panel)
+		export.save(fig, basename, dpi=dpi)
+		return fig
+
+	# Merge the background before forking so that every worker inherits it
+	_bmap.background
+	size = (figsize[0] / ncols, figsize[1] / nrows)
+	ctx = multiprocessing.get_context('fork')
+	with ProcessPoolExecutor(processes, mp_context=ctx) as pool, instrument.stage('workers', panels=len(panels)):
+		fragments = list(pool.map(_render_panel, [(panel, size, dpi) for panel in panels]))
+
+	fig, axs = plt.subplots(nrows, ncols, figsize=figsize, facecolor='w', gridspec_kw={'wspace': wspace, 'hspace': hspace})
+	for ax in axs.ravel():
+		ax.set_axis_off()
+	for ax, img in zip(axs.ravel(), fragments):
+		ax.imshow(img, interpolation='none')
+	export.save(fig, basename, dpi=dpi)
+	return fig
@@ -0,0 +1,86 @@
+'''Numeric period axis of the JSON databases and the PSD store.
+
+The JSON databases key their periods by strings ('0.0992', '0.25', '1.0')
+in file order. table() returns a product on a sorted float axis instead,
+as one (station, period) array, and every other function works on such an
+axis with any number of leading (station, day, ...) dimensions:
+
+	select(periods, hi=1.0)               slice of the periods up to 1 s, by
+	                                      binary search instead of a fixed [:20]
+	interpolate(periods, vals, targets)   linear in log period, NaN outside the axis
+	band_average(periods, vals, bands)    mean dB level inside (low, high) bands
+	octave_bands(0.05, 10)                (low, high) bands of an octave
+
+	axis, vals = periods.table(jsondb.load('DBs/jsons/yearly_median_all.json'), stas)
+	vals = periods.band_average(axis, vals, periods.octave_bands(0.05, 10))
+'''
+from collections import namedtuple
+
+import numpy as np
+
+Table = namedtuple('Table', ['periods', 'values'])
+
+
+def sort_keys(keys):
+	'''String period keys sorted by value, and their float periods.'''
+	vals = np.array([float(key) for key in keys])
+	order = np.argsort(vals, kind='stable')
+	return [keys[i] for i in order], vals[order]
+
+
+def select(periods, lo=None, hi=None):
+	'''Slice of a sorted period axis with lo <= period <= hi (ends optional).'''
+	periods = np.asarray(periods, dtype=float)
+	start = 0 if lo is None else int(np.searchsorted(periods, lo, side='left'))
+	stop = len(periods) if hi is None else int(np.searchsorted(periods, hi, side='right'))
+	return slice(start, max(start, stop))
+
+
+def table(db, stas, lo=None, hi=None):
+	'''(periods, (station, period) values) of a jsondb database on its sorted float axis.
+
+	Only for databases with one value per station, see jsondb.JsonDB.table.'''
+	keys, axis = sort_keys(db.periods)
+	sel = select(axis, lo, hi)
+	return Table(axis[sel], db.table(stas, keys[sel]))
+
+
+def interpolate(periods, values, targets):
+	'''Values at the target periods, linear in log period along the last axis.
+
+	Targets outside the axis, and targets next to a NaN value, are NaN.'''
+	logp = np.log(np.asarray(periods, dtype=float))
+	logt = np.log(np.atleast_1d(np.asarray(targets, dtype=float)))
+	values = np.asarray(values)
+	hi = np.clip(np.searchsorted(logp, logt, side='left'), 1, len(logp) - 1)
+	lo = hi - 1
+	frac = (logt - logp[lo]) / (logp[hi] - logp[lo])
+	out = values[..., lo] + (values[..., hi] - values[..., lo]) * frac
+	# Exact hits at the first period and outside the axis
+	out = np.where(logt == logp[0], values[..., :1], out)
+	return np.where((logt < logp[0]) | (logt > logp[-1]), np.nan, out)
+
+
+def octave_bands(lo, hi, fraction=1):
+	'''(band, 2) low and high periods of 1/fraction octave bands with centres from lo up to hi.'''
+	n = int(np.floor(fraction * np.log2(hi / lo) + 1e-9)) + 1
+	centres = lo * 2. ** (np.arange(n) / fraction)
+	return np.column_stack([centres * 2 ** (-0.5 / fraction), centres * 2 ** (0.5 / fraction)])
+
+
+def band_matrix(periods, bands):
+	'''(band, period) 0/1 weights of the periods inside every (low, high) band, ends included.'''
+	periods = np.asarray(periods, dtype=float)
+	bands = np.asarray(bands, dtype=float).reshape(-1, 2)
+	return ((periods >= bands[:, :1]) & (periods <= bands[:, 1:])).astype(float)
+
+
+def band_average(periods, values, bands):
+	'''Mean over the periods of every band along the last axis, NaN values left out.
+
+	A band without a value (or without a period of the axis) is NaN.'''
+	values = np.asarray(values)
+	weights = band_matrix(periods, bands).astype(values.dtype if values.dtype.kind == 'f' else float)
+	valid = ~np.isnan(values)
+	with np.errstate(invalid='ignore', divide='ignore'):
+		return np.where(valid, values, 0) @ weights.T / (valid.astype(weights.dtype) @ weights.T)
@@ -0,0 +1,58 @@
+'''Station to province assignment from DBs/limits_IT_provinces.geojson.
+
+All stations are placed in their province with one STRtree query over the
+province polygons. The result is cached in DBs/station_provinces.csv,
+next to station_attributes.csv, and rebuilt when either input is newer.
+'''
+import os
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+import stations
+
+PROVINCES = 'DBs/limits_IT_provinces.geojson'
+CACHE = 'DBs/station_provinces.csv'
+
+
+def assign(lons, lats, geoms):
+	'''Index into geoms of the polygon containing every point, -1 outside all of them.'''
+	tree = shapely.STRtree(np.asarray(geoms))
+	pts = shapely.points(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+	pt_idx, geom_idx = tree.query(pts, predicate='within')
+	out = np.full(len(pts), -1, dtype=int)
+	# Points on a shared border keep the first polygon
+	out[pt_idx[::-1]] = geom_idx[::-1]
+	return out
+
+
+def build(stations_path=stations.STATIONS, provinces_path=PROVINCES):
+	'''DataFrame of every station with its province name (empty outside Italy).'''
+	sta_db = stations.load(stations_path)
+	polygon = gpd.read_file(provinces_path)
+	idx = assign(sta_db.lon, sta_db.lat, polygon.geometry.values)
+	names = polygon.prov_name.to_numpy(dtype=object)
+	prov = np.where(idx >= 0, names[idx], '')
+	return pd.DataFrame({'sta': sta_db.db['sta'], 'prov_name': prov})
+
+
+def load(stations_path=stations.STATIONS, provinces_path=PROVINCES, cache=CACHE):
+	'''Station -> province name, from the cache when it is up to date.'''
+	fresh = os.path.exists(cache) and all(os.path.getmtime(cache) >= os.path.getmtime(p) for p in (stations_path, provinces_path))
+	if fresh:
+		db = pd.read_csv(cache, keep_default_na=False)
+	else:
+		db = build(stations_path, provinces_path)
+		db.to_csv(cache, index=False)
+	return dict(zip(db['sta'], db['prov_name']))
+
+
+def by_province(stas, sta_prov=None):
+	'''Group a station list by province, keeping its order within each province.'''
+	sta_prov = load() if sta_prov is None else sta_prov
+	groups = {}
+	for sta in stas:
+		groups.setdefault(sta_prov.get(sta, ''), []).append(sta)
+	return groups
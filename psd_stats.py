@@ -0,0 +1,38 @@
+'''Batched reductions of (day, hour key, period) PSD cubes.'''
+import numpy as np
+
+import instrument
+
+
+@instrument.timed('median')
+def hourly_percentiles(vals, q=50, over_hours=False):
+	'''NaN-aware percentiles over the day axis of a (day, hour, period) cube.
+
+	Returns an (hour, period) array, or (period,) with over_hours=True where
+	days and hours are pooled. With a sequence of q the percentiles are
+	stacked on a leading axis. Matches np.nanpercentile (linear method) but
+	sorts the cube once instead of reducing every column separately.'''
+	vals = np.asarray(vals, dtype=float)
+	if over_hours:
+		vals = vals.reshape(-1, vals.shape[-1])
+	# NaNs sort to the end, so the valid samples of every column come first
+	srt = np.sort(vals, axis=0)
+	n = np.count_nonzero(~np.isnan(vals), axis=0)
+
+	qs = np.atleast_1d(np.asarray(q, dtype=float)) / 100
+	pos = qs.reshape((-1,) + (1,) * n.ndim) * (n - 1)
+	lo = np.clip(np.floor(pos).astype(int), 0, None)
+	hi = np.minimum(lo + 1, np.clip(n - 1, 0, None))
+	frac = pos - lo
+	lo_vals = np.take_along_axis(srt, lo, axis=0)
+	hi_vals = np.take_along_axis(srt, hi, axis=0)
+	out = lo_vals + (hi_vals - lo_vals) * frac
+	out[:, n == 0] = np.nan
+	if np.ndim(q) == 0:
+		out = out[0]
+	return out
+
+
+def hourly_medians(vals, over_hours=False):
+	'''Median over days of a (day, hour, period) cube, see hourly_percentiles.'''
+	return hourly_percentiles(vals, 50, over_hours)
@@ -0,0 +1,271 @@
+'''Columnar store for the daily hourly PSDs in DBs/sens_only.
+
+The sens_only tree holds one npz per station and day
+(sens_only/<year>/<doy>/<sta>.npz). The first member of each npz is the
+period axis and every other member is the PSD of one hour key. Ingesting
+packs the tree into one (day, hour key, period) array per station and year
+
+	DBs/psd_store/<year>/<sta>.npy
+	DBs/psd_store/<year>/index.json
+
+so that a figure reads a station-year with a single memory-mapped open
+instead of one np.load per day. Re-running the ingest only reads the day
+folders that are not in the index yet, and rebuilds the stations whose
+array does not match the index (left by an interrupted ingest).
+
+The hour-key axis of a year is the union of the keys of every ingested
+file, in order of first appearance. A key first seen in a later file
+widens the stored arrays, and days without a key hold NaN there. The npz files are decoded ahead
+of use by PSD_READERS threads (default 8), at most PSD_PREFETCH files
+(default 32) at a time, so that per-file latency on network storage
+overlaps with the packing; PSD_READERS=1 reads them one by one.
+
+	python psd_store.py                 # every year in DBs/sens_only
+	python psd_store.py 2020 2022       # selected years
+'''
+import argparse
+import contextlib
+import glob
+import itertools
+import json
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import exclusions
+import instrument
+import jsondb
+import periods as period_axis
+
+SRC = 'DBs/sens_only'
+STORE = 'DBs/psd_store'
+# Reader threads and files decoded ahead, for the per-file latency of network storage
+READERS = int(os.environ.get('PSD_READERS', '8') or 1)
+DEPTH = int(os.environ.get('PSD_PREFETCH', '32') or 1)
+
+PSDCube = namedtuple('PSDCube', ['periods', 'keys', 'days', 'vals', 'lost'])
+
+
+def _read_index(ydir):
+	path = os.path.join(ydir, 'index.json')
+	if not os.path.exists(path):
+		return {'periods': None, 'keys': None, 'folders': [], 'days': {}}
+	with open(path) as f:
+		return json.load(f)
+
+
+def _write_index(ydir, index):
+	path = os.path.join(ydir, 'index.json')
+	with jsondb.atomic_open(path, 'w') as f:
+		json.dump(index, f)
+
+
+def _read_day(npz, nper):
+	# The hour keys of one daily npz in file order and their (key, period) rows
+	with np.load(npz) as res:
+		keys = res.files[1:]
+		out = np.full((len(keys), nper), np.nan)
+		for i, psd in enumerate(keys):
+			row = res[psd][:nper]
+			out[i, :len(row)] = row
+	return keys, out
+
+
+def align(file_keys, vals, keys, npz=''):
+	'''Rows of a day moved to the order of keys, NaN where a key is missing.
+
+	Raises ValueError for a key that is not in keys.'''
+	pos = {key: i for i, key in enumerate(keys)}
+	unknown = [key for key in file_keys if key not in pos]
+	if unknown:
+		raise ValueError(f'{npz}: hour keys {unknown} not in {keys}')
+	out = np.full((len(keys), vals.shape[1]), np.nan)
+	out[[pos[key] for key in file_keys]] = vals
+	return out
+
+
+@instrument.timed('npz')
+def read_day(npz, keys, nper):
+	'''Return the (hour key, period) array of one daily npz, NaN where a key is missing.'''
+	instrument.count(files=1)
+	return align(*_read_day(npz, nper), keys, npz)
+
+
+def prefetch(npzs, nper, readers=READERS, depth=DEPTH):
+	'''Yield the (hour keys, (key, period) array) of every npz in order, decoded
+	ahead by a pool of reader threads.
+
+	At most depth files are read or waiting at any time, so memory stays
+	bounded however long the list is. readers=1 reads in the calling thread.'''
+	if readers <= 1:
+		for npz in npzs:
+			with instrument.stage('npz', files=1):
+				out = _read_day(npz, nper)
+			yield out
+		return
+	npzs = iter(npzs)
+	pending = deque()
+	# yearly_median calls this inside forked station workers, and a forked
+	# process has no threads, so the readers are started per call
+	with ThreadPoolExecutor(readers) as pool:
+		try:
+			for npz in itertools.islice(npzs, max(depth, 1)):
+				pending.append(pool.submit(_read_day, npz, nper))
+			while pending:
+				# Only the wait for a file that is not decoded yet counts as npz time
+				with instrument.stage('npz', files=1):
+					out = pending.popleft().result()
+				for npz in itertools.islice(npzs, 1):
+					pending.append(pool.submit(_read_day, npz, nper))
+				yield out
+		finally:
+			for job in pending:
+				job.cancel()
+
+
+def _widen(ydir, index, keys):
+	# Add NaN columns for new hour keys to every stored station array
+	old = len(index['keys'] or [])
+	for sta in index['days']:
+		path = os.path.join(ydir, sta + '.npy')
+		vals = np.load(path)
+		wide = np.full((vals.shape[0], len(keys), vals.shape[2]), np.nan, dtype=vals.dtype)
+		wide[:, :old] = vals
+		with jsondb.atomic_open(path) as f:
+			np.save(f, wide)
+	index['keys'] = list(keys)
+
+
+def _stale(ydir, index):
+	# Stations whose array does not match the index, left by an interrupted ingest
+	shape = (len(index['keys'] or []), len(index['periods'] or []))
+	out = []
+	for sta, days in index['days'].items():
+		path = os.path.join(ydir, sta + '.npy')
+		if not os.path.exists(path) or np.load(path, mmap_mode='r').shape != (len(days),) + shape:
+			out.append(sta)
+	return out
+
+
+def _append(ydir, sta, days, vals, index):
+	# Merge the new days into the station array, keeping the day axis sorted
+	path = os.path.join(ydir, sta + '.npy')
+	old_days = index['days'].get(sta, [])
+	if old_days:
+		vals = np.concatenate([np.load(path), vals])
+		days = old_days + days
+	order = np.argsort(days, kind='stable')
+	with jsondb.atomic_open(path) as f:
+		np.save(f, vals[order])
+	index['days'][sta] = [int(days[i]) for i in order]
+
+
+def ingest_year(year, src=SRC, store=STORE, verbose=True):
+	'''Add the day folders of one year that are not in the store yet.
+
+	Returns the number of new day folders.'''
+	ydir = os.path.join(store, str(year))
+	os.makedirs(ydir, exist_ok=True)
+	index = _read_index(ydir)
+	done = set(index['folders'])
+	folders = sorted(d for d in os.listdir(os.path.join(src, str(year)))
+					 if d.isdigit() and d not in done)
+	# Arrays changed by an interrupted run after its last index write are rebuilt from every folder
+	stale = _stale(ydir, index)
+	if not folders and not stale:
+		return 0
+
+	# Group the new files by station
+	files = {}
+	for folder in folders:
+		for npz in glob.glob(os.path.join(src, str(year), folder, '*.npz')):
+			sta = os.path.splitext(os.path.basename(npz))[0]
+			files.setdefault(sta, []).append((int(folder), npz))
+	for sta in stale:
+		del index['days'][sta]
+		with contextlib.suppress(FileNotFoundError):
+			os.remove(os.path.join(ydir, sta + '.npy'))
+		for folder in sorted(done):
+			npz = os.path.join(src, str(year), folder, sta + '.npz')
+			if os.path.exists(npz):
+				files.setdefault(sta, []).append((int(folder), npz))
+
+	if index['periods'] is None:
+		first = next(iter(files.values()))[0][1]
+		with np.load(first) as res:
+			index['periods'] = res[res.files[0]].tolist()
+		index['keys'] = []
+	nper = len(index['periods'])
+
+	# One read-ahead stream over all files, consumed station by station
+	flat = [(sta, day, npz) for sta, day_files in sorted(files.items()) for day, npz in day_files]
+	arrays = prefetch([npz for _, _, npz in flat], nper)
+	for sta, group in itertools.groupby(flat, key=lambda rec: rec[0]):
+		group = list(group)
+		read = [next(arrays) for _ in group]
+		# The stored keys are the union of all keys seen, in order of appearance
+		new = [key for file_keys, _ in read for key in file_keys if key not in index['keys']]
+		if new:
+			_widen(ydir, index, index['keys'] + list(dict.fromkeys(new)))
+		vals = np.stack([align(file_keys, rows, index['keys'], npz) for (file_keys, rows), (_, _, npz) in zip(read, group)])
+		_append(ydir, sta, [day for _, day, _ in group], vals, index)
+
+	index['folders'] = sorted(done.union(folders))
+	_write_index(ydir, index)
+	if verbose:
+		print(f'{year}: {len(folders)} new day folders, {len(files)} stations'
+			  + (f', {len(stale)} rebuilt' if stale else ''))
+	return len(folders)
+
+
+def ingest(years=None, src=SRC, store=STORE, verbose=True):
+	'''Incrementally ingest every (or the given) year of the sens_only tree.'''
+	if years is None:
+		years = sorted(d for d in os.listdir(src) if d.isdigit())
+	return {str(year): ingest_year(year, src, store, verbose) for year in years}
+
+
+def stations(year, store=STORE):
+	'''Stations with data in the store for a year.'''
+	return sorted(_read_index(os.path.join(store, str(year)))['days'])
+
+
+@instrument.timed('store')
+def load(sta, year, nper=None, store=STORE, exclude=exclusions.CALENDAR, lo=None, hi=None):
+	'''Return the PSD cube of a station and year.
+
+	vals is a read-only memory-mapped (day, hour key, period) array, cut to
+	the first nper periods, or to the periods from lo to hi s, without
+	copying. Days listed in the exclusion
+	calendar are masked out (the kept days are then read into memory) and
+	their number is returned as lost; exclude=None keeps every day. Returns
+	None when the station has no data for the year.'''
+	ydir = os.path.join(store, str(year))
+	index = _read_index(ydir)
+	if sta not in index['days']:
+		return None
+	vals = np.load(os.path.join(ydir, sta + '.npy'), mmap_mode='r')
+	periods = np.array(index['periods'])
+	days = np.array(index['days'][sta])
+	sel = slice(nper) if nper is not None else period_axis.select(periods, lo, hi)
+	vals = vals[:, :, sel]
+	periods = periods[sel]
+	instrument.count(stations=1, days=len(days))
+	lost = 0
+	if exclude:
+		keep = exclusions.mask(sta, year, days, exclude)
+		lost = int(len(days) - keep.sum())
+		if lost:
+			vals, days = vals[keep], days[keep]
+	return PSDCube(periods, index['keys'], days, vals, lost)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Pack DBs/sens_only into the PSD store.')
+	parser.add_argument('years', nargs='*', help='years to ingest (default: all)')
+	parser.add_argument('--src', default=SRC)
+	parser.add_argument('--store', default=STORE)
+	args = parser.parse_args()
+	ingest(args.years or None, args.src, args.store)
@@ -0,0 +1,70 @@
+'''Columnar collection of per-station results.
+
+	table = ResultTable()
+	table.extend(float(period), stnames, dif, stlas, stlos)
+	table.frame()                      # one DataFrame at the end
+	table.write_periods('DBs/CovidDif')  # one CSV (or Parquet) per period
+'''
+import os
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['Period', 'Station', 'Value', 'Lat', 'Lon']
+
+
+class ResultTable(object):
+	'''(period, station, value, lat, lon) rows kept in preallocated column buffers.'''
+
+	def __init__(self, capacity=1024):
+		self.n = 0
+		self.cols = {
+			'Period': np.empty(capacity, dtype=float),
+			'Station': np.empty(capacity, dtype=object),
+			'Value': np.empty(capacity, dtype=float),
+			'Lat': np.empty(capacity, dtype=float),
+			'Lon': np.empty(capacity, dtype=float),
+		}
+
+	def __len__(self):
+		return self.n
+
+	def _reserve(self, size):
+		capacity = len(self.cols['Period'])
+		if size <= capacity:
+			return
+		while capacity < size:
+			capacity *= 2
+		for name, col in self.cols.items():
+			new = np.empty(capacity, dtype=col.dtype)
+			new[:self.n] = col[:self.n]
+			self.cols[name] = new
+
+	def extend(self, period, stas, values, lats=np.nan, lons=np.nan):
+		'''Append the rows of one period; lats/lons may be scalars.'''
+		k = len(stas)
+		self._reserve(self.n + k)
+		sl = slice(self.n, self.n + k)
+		self.cols['Period'][sl] = period
+		self.cols['Station'][sl] = stas
+		self.cols['Value'][sl] = values
+		self.cols['Lat'][sl] = lats
+		self.cols['Lon'][sl] = lons
+		self.n += k
+
+	def frame(self):
+		return pd.DataFrame({name: self.cols[name][:self.n] for name in COLUMNS})
+
+	def write_periods(self, outdir, fmt='csv', columns=COLUMNS):
+		'''Write one <period>.csv or <period>.parquet per period under outdir.'''
+		os.makedirs(outdir, exist_ok=True)
+		df = self.frame()[columns]
+		paths = []
+		for period, per_db in df.groupby('Period', sort=False):
+			path = os.path.join(outdir, f'{period}.{fmt}')
+			if fmt == 'parquet':
+				per_db.to_parquet(path, index=False)
+			else:
+				per_db.to_csv(path, index=False)
+			paths.append(path)
+		return paths
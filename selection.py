@@ -0,0 +1,82 @@
+'''Station selection shared by the figure scripts.
+
+Criteria are plain sets of station codes (ninetyplus.csv, the completeness
+thresholds of completeness.csv, or any other set). common() intersects the
+stations of any number of period -> station databases with them in linear
+time and keeps the order in which the stations appear in the first one.
+'''
+import functools
+
+import numpy as np
+import pandas as pd
+
+NINETY = 'DBs/ninetyplus.csv'
+COMPLETENESS = 'DBs/completeness.csv'
+
+
+@functools.lru_cache(maxsize=None)
+def ninetyplus(path=NINETY):
+	'''Stations listed in ninetyplus.csv.'''
+	return frozenset(pd.read_csv(path).Station)
+
+
+@functools.lru_cache(maxsize=None)
+def complete(path=COMPLETENESS, covid=50, nocovid=50):
+	'''Stations with CovidComp >= covid and NoCovidComp >= nocovid in completeness.csv.'''
+	db_comp = pd.read_csv(path)
+	return frozenset(db_comp[(db_comp.CovidComp >= covid) & (db_comp.NoCovidComp >= nocovid)].Station)
+
+
+def stations_of(db, periods=None):
+	'''Stations of a database in any of the periods, in order of appearance.'''
+	periods = list(db) if periods is None else periods
+	seen = {}
+	for period in periods:
+		seen.update(dict.fromkeys(db[period]))
+	return list(seen)
+
+
+def mask(stas, *criteria):
+	'''Boolean array of which stations satisfy every criterion.'''
+	stas = np.asarray(stas, dtype=str)
+	keep = np.ones(len(stas), dtype=bool)
+	for crit in criteria:
+		keep &= np.isin(stas, np.array(sorted(crit), dtype=str))
+	return keep
+
+
+class Selection(object):
+	'''Ordered station selection with index arrays into other station lists.'''
+
+	def __init__(self, stations):
+		self.stations = list(stations)
+		self.pos = {sta: i for i, sta in enumerate(self.stations)}
+
+	def __len__(self):
+		return len(self.stations)
+
+	def __iter__(self):
+		return iter(self.stations)
+
+	def __contains__(self, sta):
+		return sta in self.pos
+
+	def index(self, stas):
+		'''Position of every selected station in stas, -1 where it is absent.'''
+		where = {sta: i for i, sta in enumerate(stas)}
+		return np.array([where.get(sta, -1) for sta in self.stations], dtype=int)
+
+	def coords(self, sta_db):
+		'''(lats, lons) of the selection from a stations.StationIndex.'''
+		return sta_db.coords(self.stations)
+
+
+def common(*datasets, periods=None, criteria=()):
+	'''Stations present in every dataset and satisfying every criterion.'''
+	first = stations_of(datasets[0], periods)
+	keep = set(first)
+	for db in datasets[1:]:
+		keep.intersection_update(stations_of(db, periods))
+	for crit in criteria:
+		keep.intersection_update(crit)
+	return Selection([sta for sta in first if sta in keep])
@@ -0,0 +1,127 @@
+'''Per-station statistics of the DBs/jsons databases, cached by content hash.
+
+For every period and station of a JSON database the median, the number of
+samples and any requested percentiles are computed once and stored in
+DBs/jsons/.cache/<name>.<hash>.stats.npz, where <hash> is the SHA-1 of the
+JSON file. A changed JSON gets a new hash and therefore new statistics.
+
+	st = station_stats('DBs/jsons/day_ext.json', stas, periods, percentiles=(5, 95))
+	st.median[per_idx]          # aligned with stas, NaN where missing
+'''
+import contextlib
+import glob
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+import instrument
+import jsondb
+
+Stats = namedtuple('Stats', ['periods', 'stations', 'median', 'count', 'percentiles'])
+
+
+def content_hash(path):
+	'''SHA-1 of a file, remembered per (size, mtime) in a sidecar file.'''
+	side = os.path.splitext(jsondb.cache_path(path))[0] + '.sha1.json'
+	st = os.stat(path)
+	stamp = [st.st_size, st.st_mtime_ns]
+	if os.path.exists(side):
+		with open(side) as f:
+			known = json.load(f)
+		if known['stamp'] == stamp:
+			return known['sha1']
+	sha = hashlib.sha1()
+	with open(path, 'rb') as f:
+		for chunk in iter(lambda: f.read(1 << 20), b''):
+			sha.update(chunk)
+	os.makedirs(os.path.dirname(side), exist_ok=True)
+	with jsondb.atomic_open(side, 'w') as f:
+		json.dump({'stamp': stamp, 'sha1': sha.hexdigest()}, f)
+	return sha.hexdigest()
+
+
+def ragged_percentiles(values, offsets, q):
+	'''Percentiles (linear, like np.percentile) of every values[offsets[i]:offsets[i+1]].
+
+	Segments containing a NaN give NaN, empty segments give NaN.'''
+	counts = np.diff(offsets)
+	seg = np.repeat(np.arange(len(counts)), counts)
+	srt = values[np.lexsort((values, seg))]
+	qs = np.atleast_1d(np.asarray(q, dtype=float))[:, None] / 100
+	pos = offsets[:-1] + qs * np.clip(counts - 1, 0, None)
+	lo = np.floor(pos).astype(int)
+	hi = np.minimum(lo + 1, offsets[1:] - 1)
+	frac = pos - lo
+	lo = np.minimum(lo, len(srt) - 1)
+	hi = np.clip(hi, 0, len(srt) - 1)
+	out = srt[lo] + (srt[hi] - srt[lo]) * frac if len(srt) else np.full(pos.shape, np.nan)
+	has_nan = np.bincount(seg, weights=np.isnan(values), minlength=len(counts)) > 0
+	out[:, has_nan | (counts == 0)] = np.nan
+	return out
+
+
+def _compute(path, sha1, percentiles):
+	# Values of exactly the JSON content the statistics are named after
+	db = jsondb.load(path, sha1)
+	arrays = {'periods': np.array(db.periods, dtype=str), 'percentiles': np.array(percentiles, dtype=float)}
+	for i, period in enumerate(db.periods):
+		view = db[period]
+		if view.offsets is None:
+			offsets = np.arange(len(view.values) + 1)
+		else:
+			offsets = view.offsets
+		qs = ragged_percentiles(view.values, offsets, (50,) + tuple(percentiles))
+		arrays[f'stas_{i}'] = view.stas
+		arrays[f'median_{i}'] = qs[0]
+		arrays[f'count_{i}'] = np.diff(offsets)
+		arrays[f'pct_{i}'] = qs[1:]
+	return arrays
+
+
+def _load(path, percentiles):
+	root = os.path.splitext(jsondb.cache_path(path))[0]
+	sha1 = content_hash(path)
+	out = f'{root}.{sha1[:16]}.stats.npz'
+	if os.path.exists(out):
+		cached = dict(np.load(out))
+		if set(percentiles) <= set(cached['percentiles'].tolist()):
+			return cached
+		percentiles = sorted(set(percentiles).union(cached['percentiles'].tolist()))
+	arrays = _compute(path, sha1, tuple(percentiles))
+	with jsondb.atomic_open(out) as f:
+		np.savez(f, **arrays)
+	# Statistics of earlier versions of the JSON are not needed anymore
+	for old in glob.glob(root + '.*.stats.npz'):
+		if old != out:
+			with contextlib.suppress(FileNotFoundError):
+				os.remove(old)
+	return arrays
+
+
+@instrument.timed('stats')
+def station_stats(path, stas, periods=None, percentiles=()):
+	'''Median, count and percentiles of every (period, station), as (period, station) arrays.
+
+	Stations missing from a period get NaN statistics and a count of 0.'''
+	instrument.count(stations=len(stas))
+	arrays = _load(path, tuple(percentiles))
+	all_periods = arrays['periods'].tolist()
+	periods = all_periods if periods is None else list(periods)
+	cached_q = arrays['percentiles'].tolist()
+
+	median = np.full((len(periods), len(stas)), np.nan)
+	count = np.zeros((len(periods), len(stas)), dtype=int)
+	pcts = {q: np.full((len(periods), len(stas)), np.nan) for q in percentiles}
+	for p, period in enumerate(periods):
+		i = all_periods.index(period)
+		pos = {sta: j for j, sta in enumerate(arrays[f'stas_{i}'].tolist())}
+		idx = np.array([pos.get(sta, -1) for sta in stas], dtype=int)
+		found = idx >= 0
+		median[p, found] = arrays[f'median_{i}'][idx[found]]
+		count[p, found] = arrays[f'count_{i}'][idx[found]]
+		for q in percentiles:
+			pcts[q][p, found] = arrays[f'pct_{i}'][cached_q.index(q)][idx[found]]
+	return Stats(periods, list(stas), median, count, pcts)
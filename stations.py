@@ -0,0 +1,54 @@
+'''Station metadata from DBs/station_attributes.csv, indexed by station code.'''
+import functools
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import instrument
+
+STATIONS = 'DBs/station_attributes.csv'
+
+
+class StationIndex(object):
+	'''Station-keyed view of the station attributes table.'''
+
+	def __init__(self, db):
+		self.db = db
+		self.lat = db['lat'].to_numpy(dtype=float)
+		self.lon = db['lon'].to_numpy(dtype=float)
+		# First row wins for duplicated codes, as with .index.tolist()[0]
+		self.pos = {}
+		for i, sta in enumerate(db['sta']):
+			self.pos.setdefault(sta, i)
+
+	def __contains__(self, sta):
+		return sta in self.pos
+
+	def positions(self, stas):
+		'''Row of every station in the table, -1 for unknown stations.'''
+		return np.array([self.pos.get(sta, -1) for sta in stas], dtype=int)
+
+	def missing(self, stas):
+		return [sta for sta in stas if sta not in self.pos]
+
+	@instrument.timed('stations')
+	def coords(self, stas, warn=True):
+		'''Return (lats, lons) arrays for a list of stations.
+
+		Unknown stations get NaN coordinates and are reported with a warning.'''
+		instrument.count(stations=len(stas))
+		idx = self.positions(stas)
+		lats = np.where(idx >= 0, self.lat[idx], np.nan)
+		lons = np.where(idx >= 0, self.lon[idx], np.nan)
+		if warn and (idx < 0).any():
+			missing = [sta for sta, i in zip(stas, idx) if i < 0]
+			warnings.warn(f'{len(missing)} stations not in station attributes: {", ".join(missing)}')
+		return lats, lons
+
+
+@instrument.timed('stations')
+@functools.lru_cache(maxsize=None)
+def load(path=STATIONS):
+	'''Read the station attributes once per path.'''
+	return StationIndex(pd.read_csv(path))
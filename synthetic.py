@@ -0,0 +1,160 @@
+'''Synthetic DBs/ tree with the layout of the figshare data.
+
+Writes every input the figure scripts read, for any number of stations,
+days, hour keys and periods, so that the data paths can be timed without
+the real data:
+
+	station_attributes.csv, ninetyplus.csv, completeness.csv
+	it_model.csv, italian_model.csv, brune-all.csv
+	limits_IT_provinces.geojson, DCIS_POPRES1_11092023115658356.csv
+	municipalities.csv (population centres for exposure.py)
+	jsons/yearly_median_{ext,all}[_covid][_diff].json (one value per station)
+	jsons/{day,night,wd,we}_ext[_covid].json           (samples per station)
+	sens_only/<2020|2022>/<doy>/<sta>.npz
+
+The stations named in Figure8.py and Figure7.py come first. Those of
+Figure7.py are placed in the ten most populated provinces, all other
+stations in the rest of a grid of rectangular provinces over the map
+extent. PSD levels are drawn around -140 dB and slightly lower in the
+lockdown.
+
+	python synthetic.py /tmp/synth --stations 1000 --days 5
+'''
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import tiles
+
+# Stations Figure8.py and Figure7.py refer to by name
+NAMED = ['PTF', 'MODG', 'BGMO', 'BRSA', 'BNO', 'DSG', 'MLBT', 'SLOB', 'CAT', 'PTR', 'CLG1', 'BNT', 'CDI1', 'SVN',
+		 'BAN', 'CML', 'NAP', 'POZS', 'BCLI', 'MPCD', 'TES', 'CTU', 'CFL', 'PNA', 'PLR', 'RMMM', 'RMVT', 'SBC',
+		 'CMG', 'SNZ', 'BCN', 'SAR', 'SLC1', 'LVN1', 'CLM', 'TNO']
+# Period keys the figures index directly
+FIGURE_PERIODS = [0.0625, 0.0992, 0.125, 0.25, 0.5, 1.0]
+LOCKDOWN = (69, 139)
+GRID = (6, 6)
+BIG = 10
+MUNICIPALITIES = 8000
+
+
+def period_axis(nper):
+	'''nper periods from 0.01 to 100 s that include the figure periods, rounded like the JSON keys.'''
+	extra = max(nper - len(FIGURE_PERIODS), 0)
+	axis = np.round(np.logspace(-2, 2, extra), 4) if extra else np.empty(0)
+	return np.unique(np.concatenate([axis, FIGURE_PERIODS]))
+
+
+def station_names(n):
+	names = NAMED[:n]
+	return names + [f'S{i:05d}' for i in range(n - len(names))]
+
+
+def _provinces(extent=tiles.EXTENT, grid=GRID):
+	lon0, lon1, lat0, lat1 = extent
+	lons = np.linspace(lon0, lon1, grid[0] + 1)
+	lats = np.linspace(lat0, lat1, grid[1] + 1)
+	boxes = [(lons[i], lons[i + 1], lats[j], lats[j + 1]) for j in range(grid[1]) for i in range(grid[0])]
+	names = [f'Province {k:02d}' for k in range(len(boxes))]
+	return names, boxes
+
+
+def _write_json(path, data):
+	with open(path, 'w') as f:
+		json.dump(data, f)
+
+
+def generate(root, stations=100, days=10, hours=24, nper=40, samples=30, seed=0, sens_only=True):
+	'''Write a synthetic DBs tree under root/DBs and return its path.'''
+	rng = np.random.default_rng(seed)
+	dbs = os.path.join(root, 'DBs')
+	os.makedirs(os.path.join(dbs, 'jsons'), exist_ok=True)
+	stas = station_names(stations)
+	named = np.array([sta in NAMED for sta in stas])
+	# Figure7.py colours the stations of the big provinces by name
+	city = np.array([sta in NAMED[1:] for sta in stas])
+	periods = period_axis(nper)
+	keys = [str(round(float(p), 4)) for p in periods]
+
+	# Provinces, population and station positions
+	prov, boxes = _provinces()
+	features = [{'type': 'Feature', 'properties': {'prov_name': name},
+				 'geometry': {'type': 'Polygon', 'coordinates': [[[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]]}}
+				for name, (x0, x1, y0, y1) in zip(prov, boxes)]
+	_write_json(os.path.join(dbs, 'limits_IT_provinces.geojson'), {'type': 'FeatureCollection', 'features': features})
+	pop = np.sort(rng.integers(1e5, 4e6, len(prov)))[::-1]
+	pd.DataFrame({'Territory': prov, 'Value': pop}).to_csv(os.path.join(dbs, 'DCIS_POPRES1_11092023115658356.csv'), index=False)
+	lon0, lon1, lat0, lat1 = tiles.EXTENT
+	pd.DataFrame({'Territory': [f'Comune {i:04d}' for i in range(MUNICIPALITIES)],
+				  'Lat': rng.uniform(lat0, lat1, MUNICIPALITIES).round(5), 'Lon': rng.uniform(lon0, lon1, MUNICIPALITIES).round(5),
+				  'Value': np.round(rng.lognormal(8, 1.3, MUNICIPALITIES)).astype(int)}).to_csv(os.path.join(dbs, 'municipalities.csv'), index=False)
+	box = np.where(city, np.arange(stations) % BIG, BIG + rng.integers(0, len(prov) - BIG, stations))
+	bounds = np.array(boxes)[box]
+	# Inside the box, away from the borders
+	lon = bounds[:, 0] + (bounds[:, 1] - bounds[:, 0]) * rng.uniform(0.05, 0.95, stations)
+	lat = bounds[:, 2] + (bounds[:, 3] - bounds[:, 2]) * rng.uniform(0.05, 0.95, stations)
+	pd.DataFrame({'sta': stas, 'lat': lat.round(5), 'lon': lon.round(5)}).to_csv(os.path.join(dbs, 'station_attributes.csv'), index=False)
+
+	# Station lists
+	ninety = named | (rng.random(stations) < 0.9)
+	pd.DataFrame({'Station': np.array(stas)[ninety]}).to_csv(os.path.join(dbs, 'ninetyplus.csv'), index=False)
+	comp = np.where(named[:, None], 100, rng.integers(0, 101, (stations, 2)))
+	pd.DataFrame({'Station': stas, 'CovidComp': comp[:, 0], 'NoCovidComp': comp[:, 1]}).to_csv(os.path.join(dbs, 'completeness.csv'), index=False)
+
+	# Noise models and the Brune grid
+	model = pd.DataFrame({'Period': periods, 'IALNM': -160 + 10 * np.log10(periods + 1),
+						  'IAHNM': -100 + 5 * np.log10(periods + 1), 'Median': -135 + 8 * np.log10(periods + 1)})
+	model.to_csv(os.path.join(dbs, 'italian_model.csv'), index=False)
+	model[['Period', 'IALNM', 'IAHNM']].to_csv(os.path.join(dbs, 'it_model.csv'), sep=';', index=False)
+	delta, mag = np.meshgrid([0.01, 0.05, 0.1, 0.5, 1.0], np.arange(1, 7), indexing='ij')
+	corner = 1 / (10 ** (2.3 - 0.5 * mag))
+	pd.DataFrame({'delta': delta.ravel(), 'mag': mag.ravel(), 'T': corner.ravel(),
+				  'dB': (-150 + 12 * mag - 20 * np.log10(delta * 100)).ravel()}).to_csv(os.path.join(dbs, 'brune-all.csv'), index=False)
+
+	# Station levels, (station, period), and the lockdown drop
+	level = -140 + rng.normal(0, 8, (stations, 1)) + 5 * np.log10(periods)[None, :]
+	drop = rng.normal(1.5, 1., (stations, len(periods)))
+	for name in ('ext', 'all'):
+		for suffix, vals in (('', level), ('_covid', level - drop), ('_covid_diff', drop)):
+			_write_json(os.path.join(dbs, 'jsons', f'yearly_median_{name}{suffix}.json'),
+						{key: dict(zip(stas, vals[:, j].round(3).tolist())) for j, key in enumerate(keys)})
+	counts = rng.integers(max(samples // 2, 1), samples + 1, stations)
+	offsets = np.concatenate([[0], np.cumsum(counts)])
+	for name, shift in (('day', 3.), ('night', -3.), ('wd', 1.), ('we', -1.)):
+		for suffix, vals in (('', level + shift), ('_covid', level + shift - drop)):
+			data = {}
+			for j, key in enumerate(keys):
+				flat = (np.repeat(vals[:, j], counts) + rng.normal(0, 3, offsets[-1])).round(3).tolist()
+				data[key] = {sta: flat[offsets[i]:offsets[i + 1]] for i, sta in enumerate(stas)}
+			_write_json(os.path.join(dbs, 'jsons', f'{name}_ext{suffix}.json'), data)
+
+	# Daily hourly PSDs, days of the lockdown window in both years
+	if sens_only:
+		hour_keys = [f'h{h:02d}' for h in range(hours)]
+		for year, shift in (('2022', 0.), ('2020', -1.5)):
+			for doy in range(LOCKDOWN[0], LOCKDOWN[0] + days):
+				ddir = os.path.join(dbs, 'sens_only', year, str(doy))
+				os.makedirs(ddir, exist_ok=True)
+				for i, sta in enumerate(stas):
+					psd = level[i] + shift + rng.normal(0, 3, (hours, len(periods)))
+					# Period axis first, then one member per hour key
+					np.savez(os.path.join(ddir, sta + '.npz'), periods=periods, **dict(zip(hour_keys, psd)))
+	return dbs
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Write a synthetic DBs/ tree.')
+	parser.add_argument('root', help='directory to create DBs/ in')
+	parser.add_argument('--stations', type=int, default=100)
+	parser.add_argument('--days', type=int, default=10, help='days of sens_only per year')
+	parser.add_argument('--hours', type=int, default=24, help='hour keys per daily npz')
+	parser.add_argument('--periods', type=int, default=40)
+	parser.add_argument('--samples', type=int, default=30, help='most samples per station in the day/night/wd/we JSONs')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--no-sens-only', action='store_true', help='skip the daily npz tree')
+	args = parser.parse_args()
+	print(generate(args.root, args.stations, args.days, args.hours, args.periods, args.samples,
+				   args.seed, not args.no_sens_only))
@@ -0,0 +1,148 @@
+'''Satellite tiles for the Italy maps with an on-disk cache and an offline mode.
+
+Tiles are kept as PNG files under DBs/tiles/<style>/<z>/<x>_<y>.png and in
+an in-process LRU. The merged background of a map extent is built once and
+reused by every panel that asks for the same extent. With offline=True (or
+TILES_OFFLINE=1 in the environment) the network is never used and tiles
+missing from the cache are drawn blank.
+
+	python tiles.py fetch              # download the Italy extent at zoom 8
+	python tiles.py seed <directory>   # copy tiles from <z>/<x>/<y>.png or <z>/<x>_<y>.png
+'''
+import argparse
+import functools
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import cartopy.crs as ccrs
+import cartopy.io.img_tiles as cimgt
+import shapely
+from PIL import Image
+
+import instrument
+import jsondb
+
+TILE_CACHE = 'DBs/tiles'
+EXTENT = [6.90, 18.55, 36.5, 47]
+ZOOM = 8
+
+
+class CachedTiles(cimgt.GoogleTiles):
+	'''GoogleTiles backed by a PNG tile directory and an in-process LRU.'''
+
+	def __init__(self, style='satellite', cache_dir=TILE_CACHE, offline=None, lru_size=512):
+		super().__init__(style=style)
+		self.tile_dir = os.path.join(cache_dir, style)
+		if offline is None:
+			offline = os.environ.get('TILES_OFFLINE', '0') not in ('', '0')
+		self.offline = offline
+		self.lru_size = lru_size
+		self._lru = OrderedDict()
+		self._domains = {}
+		self._lock = threading.Lock()
+
+	def tile_path(self, tile):
+		x, y, z = tile
+		return os.path.join(self.tile_dir, str(z), f'{x}_{y}.png')
+
+	def _fetch(self, tile):
+		path = self.tile_path(tile)
+		if os.path.exists(path):
+			instrument.count(cached=1)
+			with Image.open(path) as img:
+				img.load()
+				return img
+		if self.offline:
+			instrument.count(blank=1)
+			return Image.fromarray(np.full((256, 256, 3), 250, dtype=np.uint8))
+		instrument.count(fetched=1)
+		img, _, _ = super().get_image(tile)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		with jsondb.atomic_open(path) as f:
+			img.save(f, format='PNG')
+		return img
+
+	def get_image(self, tile):
+		tile = tuple(tile)
+		with self._lock:
+			img = self._lru.get(tile)
+			if img is not None:
+				self._lru.move_to_end(tile)
+		if img is None:
+			img = self._fetch(tile)
+			with self._lock:
+				self._lru[tile] = img
+				while len(self._lru) > self.lru_size:
+					self._lru.popitem(last=False)
+		return img, self.tileextent(tile), 'lower'
+
+	def image_for_domain(self, target_domain, target_z):
+		# Merge the tiles of an extent once and hand the same raster to every panel
+		key = (tuple(np.round(target_domain.bounds, 1)), target_z)
+		if key not in self._domains:
+			self._domains[key] = super().image_for_domain(target_domain, target_z)
+		return self._domains[key]
+
+	def domain(self, extent=EXTENT):
+		'''Native (Mercator) polygon of a lon/lat extent.'''
+		lons = np.array(extent[:2])
+		lats = np.array(extent[2:])
+		xy = self.crs.transform_points(ccrs.PlateCarree(), lons, lats)
+		return shapely.box(xy[0, 0], xy[0, 1], xy[1, 0], xy[1, 1])
+
+	def prefetch(self, extent=EXTENT, zoom=ZOOM):
+		'''Make sure every tile of an extent is in the disk cache.'''
+		tiles = list(self.find_images(self.domain(extent), zoom))
+		for tile in tiles:
+			self.get_image(tile)
+		return len(tiles)
+
+	def seed(self, directory):
+		'''Copy tiles from a local directory into the cache.
+
+		Accepts the usual <z>/<x>/<y>.<ext> layout and this cache's own
+		<z>/<x>_<y>.png layout. Returns the number of tiles added.'''
+		added = 0
+		for root, _, files in os.walk(directory):
+			parts = os.path.relpath(root, directory).split(os.sep)
+			for name in files:
+				stem, ext = os.path.splitext(name)
+				if len(parts) == 2 and all(p.isdigit() for p in parts) and stem.isdigit():
+					tile = (int(parts[1]), int(stem), int(parts[0]))
+				elif len(parts) == 1 and parts[0].isdigit() and stem.count('_') == 1:
+					tile = tuple(int(i) for i in stem.split('_')) + (int(parts[0]),)
+				else:
+					continue
+				path = self.tile_path(tile)
+				if os.path.exists(path):
+					continue
+				os.makedirs(os.path.dirname(path), exist_ok=True)
+				if ext.lower() == '.png':
+					shutil.copyfile(os.path.join(root, name), path)
+				else:
+					with Image.open(os.path.join(root, name)) as img:
+						img.save(path, format='PNG')
+				added += 1
+		return added
+
+
+@functools.lru_cache(maxsize=None)
+def get_tiles(style='satellite'):
+	'''Tile provider shared by every map of the process.'''
+	return CachedTiles(style=style)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Manage the map tile cache.')
+	parser.add_argument('command', choices=['fetch', 'seed'])
+	parser.add_argument('directory', nargs='?')
+	parser.add_argument('--zoom', type=int, default=ZOOM)
+	args = parser.parse_args()
+	request = get_tiles()
+	if args.command == 'fetch':
+		print(f'{request.prefetch(zoom=args.zoom)} tiles cached in {request.tile_dir}')
+	else:
+		print(f'{request.seed(args.directory)} tiles added to {request.tile_dir}')
@@ -0,0 +1,178 @@
+'''Build the yearly_median_* JSON databases from the sens_only daily PSDs.
+
+Every daily npz of a window is read once. The PSD values of a station are
+binned into fixed dB histograms, one per period, so memory stays at
+(period, bin) counts per station whatever the number of days, and the
+median is read back from the cumulative counts to within one bin
+(DB_STEP dB). Values outside [DB_MIN, DB_MAX) go to the edge bins. Days
+listed in exclusions.csv are skipped. The files of a station are read
+ahead by psd_store.prefetch while the previous chunk is binned.
+
+The windows are the 2020 lockdown (days 69-139, 9 March - 18 May) and the
+year 2022. For a product name such as ext the builder writes
+
+	DBs/jsons/yearly_median_ext.json             2022
+	DBs/jsons/yearly_median_ext_covid.json       lockdown
+	DBs/jsons/yearly_median_ext_covid_diff.json  2022 - lockdown
+
+with periods keyed as str(round(period, 4)).
+
+The name only names the files. The builder has one reduction, every hour
+key of every day of the window pooled, and does not reproduce whatever
+selection tells the figshare ext and all products apart: --name ext and
+--name all write the same values. Keep the figshare JSONs where the two
+must differ.
+
+	python yearly_median.py --name ext -j 4
+'''
+import argparse
+import glob
+import itertools
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import exclusions
+import jsondb
+import psd_store
+
+OUT = 'DBs/jsons'
+# Product suffix -> (year, first day, last day)
+WINDOWS = {'': ('2022', 1, 366), '_covid': ('2020', 69, 139)}
+DB_MIN, DB_MAX, DB_STEP = -250., 0., 0.1
+# Days binned at a time
+CHUNK = 32
+
+
+class Histogram(object):
+	'''Fixed-bin dB histograms of one station, one per period.'''
+
+	def __init__(self, nper, lo=DB_MIN, hi=DB_MAX, step=DB_STEP):
+		self.lo, self.step = lo, step
+		self.nbins = int(round((hi - lo) / step))
+		self.counts = np.zeros((nper, self.nbins), dtype=np.int64)
+
+	def add(self, vals):
+		'''Count a (..., period) array of dB values, NaN ignored.'''
+		nper, nbins = self.counts.shape
+		vals = np.asarray(vals, dtype=float).reshape(-1, nper)
+		ok = np.isfinite(vals)
+		bins = np.clip(np.floor((vals[ok] - self.lo) / self.step), 0, nbins - 1).astype(np.int64)
+		flat = np.nonzero(ok)[1] * nbins + bins
+		self.counts += np.bincount(flat, minlength=nper * nbins).reshape(nper, nbins)
+
+	def quantile(self, q=50):
+		'''Per-period q-th percentile, linear within the bin, NaN without samples.'''
+		cum = np.cumsum(self.counts, axis=1)
+		n = cum[:, -1]
+		target = q / 100 * n
+		idx = np.minimum((cum < target[:, None]).sum(axis=1), self.nbins - 1)
+		rows = np.arange(len(n))
+		before = np.where(idx > 0, cum[rows, idx - 1], 0)
+		inbin = self.counts[rows, idx]
+		frac = np.divide(target - before, inbin, out=np.zeros(len(n)), where=inbin > 0)
+		out = self.lo + (idx + frac) * self.step
+		out[n == 0] = np.nan
+		return out
+
+
+def window_files(year, first, last, src=psd_store.SRC, exclude=exclusions.CALENDAR):
+	'''Daily npz files of a window grouped by station, excluded days left out.'''
+	files = {}
+	ydir = os.path.join(src, str(year))
+	for folder in sorted(os.listdir(ydir)):
+		if folder.isdigit() and first <= int(folder) <= last:
+			for npz in glob.glob(os.path.join(ydir, folder, '*.npz')):
+				sta = os.path.splitext(os.path.basename(npz))[0]
+				files.setdefault(sta, []).append((int(folder), npz))
+	out = {}
+	for sta, day_files in files.items():
+		keep = exclusions.mask(sta, year, [day for day, _ in day_files], exclude) if exclude else None
+		out[sta] = [npz for i, (_, npz) in enumerate(day_files) if keep is None or keep[i]]
+	return {sta: npzs for sta, npzs in out.items() if npzs}
+
+
+def station_quantile(npzs, nper, q=50):
+	hist = Histogram(nper)
+	arrays = psd_store.prefetch(npzs, nper)
+	for i in range(0, len(npzs), CHUNK):
+		# Every hour key of a day is a sample, whichever keys the file holds
+		hist.add(np.concatenate([vals for _, vals in itertools.islice(arrays, CHUNK)]))
+	return hist.quantile(q)
+
+
+def _station_job(args):
+	return station_quantile(*args)
+
+
+def window_quantiles(year, first, last, q=50, src=psd_store.SRC, processes=1):
+	'''(periods, {station: per-period q-th percentile}) of one window.'''
+	files = window_files(year, first, last, src)
+	if not files:
+		return np.array([]), {}
+	with np.load(next(iter(files.values()))[0]) as res:
+		periods = res[res.files[0]]
+	stas = sorted(files)
+	jobs = [(files[sta], len(periods), q) for sta in stas]
+	if processes > 1:
+		with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('fork')) as pool:
+			meds = list(pool.map(_station_job, jobs))
+	else:
+		meds = [_station_job(job) for job in jobs]
+	return periods, dict(zip(stas, meds))
+
+
+def to_json(periods, values):
+	'''period key -> station -> value, stations without data left out.'''
+	data = {}
+	for j, period in enumerate(periods):
+		data[str(round(float(period), 4))] = {sta: round(float(vals[j]), 4) for sta, vals in values.items()
+											  if not np.isnan(vals[j])}
+	return data
+
+
+def _write(path, data):
+	with jsondb.atomic_open(path, 'w') as f:
+		json.dump(data, f)
+
+
+def build(name='', q=50, src=psd_store.SRC, out=OUT, processes=1, verbose=True):
+	'''Write the 2022, lockdown and difference databases of one product name.
+
+	Returns the written paths.'''
+	stem = os.path.join(out, 'yearly_median' + (f'_{name}' if name else ''))
+	results = {}
+	for suffix, (year, first, last) in WINDOWS.items():
+		results[suffix] = window_quantiles(year, first, last, q, src, processes)
+		if verbose:
+			print(f'{year} days {first}-{last}: {len(results[suffix][1])} stations')
+	if verbose:
+		for line in exclusions.report():
+			print(line)
+
+	(periods, now), (periods_covid, covid) = results[''], results['_covid']
+	if not np.array_equal(periods, periods_covid):
+		raise ValueError('2022 and lockdown PSDs have different period axes')
+	diff = {sta: now[sta] - covid[sta] for sta in now if sta in covid}
+
+	os.makedirs(out, exist_ok=True)
+	paths = []
+	for suffix, values in (('', now), ('_covid', covid), ('_covid_diff', diff)):
+		paths.append(stem + suffix + '.json')
+		_write(paths[-1], to_json(periods, values))
+	return paths
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Build the yearly_median JSON databases from DBs/sens_only.')
+	parser.add_argument('--name', default='', help='file name of the product, e.g. ext -> yearly_median_ext*.json (same values for every name)')
+	parser.add_argument('-q', type=float, default=50, help='percentile (default: median)')
+	parser.add_argument('-j', '--jobs', type=int, default=1, help='stations processed concurrently')
+	parser.add_argument('--src', default=psd_store.SRC)
+	parser.add_argument('--out', default=OUT)
+	args = parser.parse_args()
+	for path in build(args.name, args.q, args.src, args.out, args.jobs):
+		print(path)